@@ -0,0 +1,72 @@
+"""Single writer thread that commits queued operations in batches.
+
+SQLite serializes writers, so the stores written from every worker thread
+(``crawl_state.CrawlState``, ``html_cache.HtmlCache``) do not commit per
+update. Workers only ``put()`` operations; one thread collects them and
+hands them to the store's commit function once ``batch_size`` operations
+are waiting or ``flush_interval`` seconds have passed, in arrival order.
+"""
+import queue
+import threading
+import time
+
+_STOP = object()
+
+
+class _Flush:
+    def __init__(self):
+        self.committed = threading.Event()
+
+
+class BatchWriter:
+    """Calls ``commit(batch)`` from one thread with the operations queued since the previous call"""
+    def __init__(self, commit, name="batch-writer", batch_size=200, flush_interval=1.0):
+        # commit() receives a non-empty list and handles (e.g. logs) its own errors
+        self.commit = commit
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.operations = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name=name)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def put(self, operation):
+        self.operations.put(operation)
+
+    def flush(self):
+        """Block until every operation queued so far has been committed"""
+        request = _Flush()
+        self.operations.put(request)
+        request.committed.wait()
+
+    def close(self):
+        """Commit what is queued and stop the writer thread"""
+        self.operations.put(_STOP)
+        self.thread.join()
+
+    def _commit(self, batch):
+        if batch:
+            self.commit(list(batch))
+            del batch[:]
+
+    def _run(self):
+        batch = []
+        deadline = time.time() + self.flush_interval
+        while True:
+            try:
+                operation = self.operations.get(timeout=max(0.0, deadline - time.time()))
+            except queue.Empty:
+                operation = None
+
+            if operation is _STOP:
+                self._commit(batch)
+                return
+            if isinstance(operation, _Flush):
+                self._commit(batch)
+                operation.committed.set()
+            elif operation is not None:
+                batch.append(operation)
+
+            if len(batch) >= self.batch_size or time.time() >= deadline:
+                self._commit(batch)
+                deadline = time.time() + self.flush_interval
@@ -0,0 +1,143 @@
+"""Offline benchmark of HoaBinhServiceCrawler against the local fixture server.
+
+Starts ``fixture_server.FixtureServer`` in-process, then crawls it once per
+worker count and reports services/sec, per-service latency percentiles,
+failures and the peak memory of this process plus every browser it started.
+Each run writes to its own temporary directory, so runs never resume each
+other.
+
+Usage:
+    python benchmark.py --workers 1,2,4,8 --services 200 --latency 0.1
+    python benchmark.py --engine http --workers 4,16 --error-rate 0.05 --json results.json
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from fixture_server import FixtureServer, FixtureSite
+from worker_health import process_tree_rss
+
+
+class PeakMemory:
+    """Samples the RSS of this process tree (crawler + chromedrivers + Chrome) in the background"""
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.peak = 0
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="peak-memory")
+        self.thread.daemon = True
+
+    def _run(self):
+        while True:
+            rss = process_tree_rss(os.getpid()) or 0
+            self.peak = max(self.peak, rss)
+            if self.stop.wait(self.interval):
+                return
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop.set()
+        self.thread.join()
+
+
+def run_once(listing_url, workers, crawler_options):
+    """Crawl the fixture once with ``workers`` workers and return the measurements"""
+    from crawl import HoaBinhServiceCrawler
+    work_dir = tempfile.mkdtemp(prefix=f"benchmark-{workers}-")
+    try:
+        options = dict(crawler_options)
+        options.update(
+            max_workers=workers,
+            base_url=listing_url,
+            output_name=os.path.join(work_dir, "services"),
+            state_path=os.path.join(work_dir, "state.db"),
+            resume=False,
+            consolidate_output=False,
+        )
+        with PeakMemory() as memory:
+            start = time.time()
+            crawler = HoaBinhServiceCrawler(**options)
+            ok = crawler.crawl()
+            elapsed = time.time() - start
+
+        snapshot = crawler.metrics.snapshot()
+        service_stage = snapshot["stages"].get("service", {})
+        failures = sum(row["value"] for row in snapshot["counters"]
+                       if row["name"] == "services" and row["labels"].get("result") != "ok")
+        return {
+            "workers": workers,
+            "ok": ok,
+            "services": crawler.extracted_count,
+            "seconds": elapsed,
+            "services_per_second": crawler.extracted_count / elapsed if elapsed > 0 else 0.0,
+            "latency_p50": service_stage.get("p50", 0.0),
+            "latency_p95": service_stage.get("p95", 0.0),
+            "latency_p99": service_stage.get("p99", 0.0),
+            "failed_attempts": failures,
+            "dead_lettered": crawler.dead_letter.count if crawler.dead_letter is not None else 0,
+            "peak_memory_mb": memory.peak / 1024 / 1024,
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def print_results(results):
+    print(f"{'workers':>7} {'services':>8} {'seconds':>8} {'svc/s':>7} {'p50':>6} {'p95':>6} {'p99':>6} "
+          f"{'failed':>6} {'dead':>5} {'peak MB':>8}")
+    for row in results:
+        print(f"{row['workers']:>7} {row['services']:>8} {row['seconds']:>8.1f} {row['services_per_second']:>7.2f} "
+              f"{row['latency_p50']:>6.2f} {row['latency_p95']:>6.2f} {row['latency_p99']:>6.2f} "
+              f"{row['failed_attempts']:>6} {row['dead_lettered']:>5} {row['peak_memory_mb']:>8.0f}")
+
+
+def benchmark(worker_counts, services=200, latency=0.0, jitter=0.0, error_rate=0.0, popup_error_rate=0.0,
+              seed=1, crawler_options=None):
+    """Run the crawler against a fresh fixture server once per worker count"""
+    fixture = FixtureServer(FixtureSite(services), latency=latency, jitter=jitter, error_rate=error_rate,
+                            popup_error_rate=popup_error_rate, seed=seed).start()
+    results = []
+    try:
+        for workers in worker_counts:
+            print(f"=== Benchmark: {workers} workers, {services} services ===")
+            results.append(run_once(fixture.listing_url(), workers, crawler_options or {}))
+    finally:
+        fixture.close()
+    print_results(results)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the crawler against a local stand-in of the portal")
+    parser.add_argument("--workers", default="1,2,4,8", help="comma-separated worker counts to compare")
+    parser.add_argument("--services", type=int, default=200, help="services served by the fixture")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every fixture response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay of up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of detail/search responses failing")
+    parser.add_argument("--popup-error-rate", type=float, default=0.0, help="share of popup responses failing")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--engine", choices=["selenium", "http"], default="selenium")
+    parser.add_argument("--extraction-mode", choices=["elements", "script"], default="elements")
+    parser.add_argument("--browser-profile", choices=["full", "lean"], default="full")
+    parser.add_argument("--retry-delay", type=float, default=0.5, help="first retry backoff during benchmarks")
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    from browser_profile import BrowserProfile
+    options = {
+        "engine": args.engine,
+        "extraction_mode": args.extraction_mode,
+        "browser_profile": BrowserProfile(args.browser_profile),
+        "retry_delay": args.retry_delay,
+    }
+    results = benchmark([int(count) for count in args.workers.split(",")], args.services, args.latency,
+                        args.jitter, args.error_rate, args.popup_error_rate, args.seed, options)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
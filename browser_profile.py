@@ -0,0 +1,142 @@
+"""Chrome profiles for the listing driver and the worker drivers.
+
+The "full" profile is plain headless Chrome. The "lean" profile skips what
+the crawler never reads: it disables extensions, GPU and background
+networking, uses the ``eager`` page-load strategy (DOM ready, subresources
+not awaited) and blocks resource types and URL patterns through the
+DevTools ``Network.setBlockedURLs`` command.
+
+Every driver also records Chrome's performance log, so ``TrafficStats`` can
+report the bytes and requests each page cost, per page and per worker.
+"""
+import json
+import threading
+
+from selenium.webdriver.chrome.options import Options
+
+# Network.setBlockedURLs only matches URLs, so resource types are blocked by their file extensions
+RESOURCE_TYPE_PATTERNS = {
+    "image": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico", "*.bmp"],
+    "font": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"],
+    "stylesheet": ["*.css", "*.css?*"],
+    "media": ["*.mp4", "*.webm", "*.mp3", "*.ogg", "*.wav"],
+}
+
+# Analytics, ads and social widgets loaded by the portal that no extraction reads
+THIRD_PARTY_PATTERNS = [
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*facebook.net*",
+    "*facebook.com/plugins*",
+    "*youtube.com/embed*",
+    "*hotjar.com*",
+]
+
+LEAN_ARGUMENTS = [
+    "--disable-extensions",
+    "--disable-gpu",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--metrics-recording-only",
+    "--no-first-run",
+    "--mute-audio",
+]
+
+
+class BrowserProfile:
+    """Chrome options and DevTools settings shared by every driver of a crawl"""
+    def __init__(self, name="full", block_resources=("image", "font", "stylesheet", "media"),
+                 block_urls=(), block_third_party=True, page_load_strategy=None):
+        if name not in ("full", "lean"):
+            raise ValueError(f"Unknown browser profile: {name}")
+        unknown = set(block_resources) - set(RESOURCE_TYPE_PATTERNS)
+        if unknown:
+            raise ValueError(f"Unknown resource types: {', '.join(sorted(unknown))}")
+        self.name = name
+        self.lean = name == "lean"
+        self.block_resources = list(block_resources) if self.lean else []
+        self.block_third_party = block_third_party and self.lean
+        self.page_load_strategy = page_load_strategy or ("eager" if self.lean else "normal")
+
+        # Extra URL patterns apply to every profile, so single hosts can be blocked on a full profile too
+        self.blocked_urls = list(block_urls)
+        for resource_type in self.block_resources:
+            self.blocked_urls.extend(RESOURCE_TYPE_PATTERNS[resource_type])
+        if self.block_third_party:
+            self.blocked_urls.extend(THIRD_PARTY_PATTERNS)
+
+    def chrome_options(self):
+        chrome_options = Options()
+        chrome_options.add_argument("--headless")
+        chrome_options.add_argument("--no-sandbox")
+        chrome_options.add_argument("--disable-dev-shm-usage")
+        chrome_options.add_argument("--window-size=1920,1080")
+        if self.lean:
+            for argument in LEAN_ARGUMENTS:
+                chrome_options.add_argument(argument)
+            if "image" in self.block_resources:
+                # Chrome then does not even request images, which URL patterns could miss
+                chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+        chrome_options.page_load_strategy = self.page_load_strategy
+        # Network events feed the bytes-transferred counter
+        chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        return chrome_options
+
+    def apply(self, driver):
+        """Enable DevTools network tracking and URL blocking on a freshly started driver"""
+        driver.execute_cdp_cmd("Network.enable", {})
+        if self.blocked_urls:
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": self.blocked_urls})
+
+
+class TrafficStats:
+    """Bytes and requests per page, summed per worker, read from Chrome's performance log"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Only running totals are kept (pages, bytes, finished, blocked), never one entry per page
+        self.workers = {}
+
+    @staticmethod
+    def read_log(driver):
+        """Drain the performance log; return (bytes received, finished requests, blocked requests)"""
+        received = finished = blocked = 0
+        try:
+            entries = driver.get_log("performance")
+        except Exception:
+            return 0, 0, 0
+        for entry in entries:
+            message = json.loads(entry["message"])["message"]
+            if message["method"] == "Network.loadingFinished":
+                received += int(message["params"].get("encodedDataLength", 0))
+                finished += 1
+            elif message["method"] == "Network.loadingFailed" and message["params"].get("blockedReason"):
+                blocked += 1
+        return received, finished, blocked
+
+    def measure(self, worker_id, driver, page):
+        """Attribute everything the driver transferred since the last call to ``page``"""
+        received, finished, blocked = self.read_log(driver)
+        with self.lock:
+            totals = self.workers.setdefault(worker_id, [0, 0, 0, 0])
+            totals[0] += 1
+            totals[1] += received
+            totals[2] += finished
+            totals[3] += blocked
+        return received, finished, blocked
+
+    def print_summary(self):
+        with self.lock:
+            pages = sum(totals[0] for totals in self.workers.values())
+            if not pages:
+                return
+            total_bytes = sum(totals[1] for totals in self.workers.values())
+            print("Browser traffic:")
+            print(f"  {pages} pages, {total_bytes / 1024 / 1024:.1f} MB transferred "
+                  f"({total_bytes / pages / 1024:.1f} KB per page), "
+                  f"{sum(totals[3] for totals in self.workers.values())} requests blocked")
+            for worker_id, (count, received, finished, blocked) in sorted(self.workers.items(), key=lambda item: str(item[0])):
+                print(f"  Worker {worker_id}: {count} pages, {received / 1024 / 1024:.1f} MB, "
+                      f"{finished} requests, {blocked} blocked")
@@ -4,169 +4,415 @@ import os
 import concurrent.futures
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException, ElementClickInterceptedException
+from selenium.common.exceptions import (
+    TimeoutException, NoSuchElementException, ElementClickInterceptedException, WebDriverException,
+    InvalidSessionIdException, NoSuchWindowException
+)
+from urllib3.exceptions import MaxRetryError, ProtocolError
 from webdriver_manager.chrome import ChromeDriverManager
+from waits import WaitEngine, WaitStats
+from output_sink import JsonlSink, stream_path, consolidate, iter_records
+from crawl_state import CrawlState
+from incremental import ChangeDetector, UNCHANGED, text_hash, decision_number
+from scheduler import Scheduler
+from browser_profile import BrowserProfile, TrafficStats
+from metrics import Metrics, MetricsServer, SnapshotWriter
+from worker_health import WorkerHealth, HealthPolicy
+from retry import Failure, RetryQueue, DeadLetterFile, TIMEOUT, POPUP_MISSING, DRIVER_CRASH, PARSE_ERROR
+from html_cache import HtmlCache
+from table_export import export_tables, export_path
 import threading
 import queue
+import contextlib
+import argparse
+from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
+import xpaths
+
+# Trang giả dùng để nhóm các link còn dang dở từ lần chạy trước khi tiếp tục crawl
+RESUME_PAGE = 0
+# Trang giả cho các link được chạy lại từ file dead-letter
+REPLAY_PAGE = -1
+
+# Số dịch vụ trên mỗi trang danh sách sau khi chọn #pageSize
+LISTING_PAGE_SIZE = 50
+
+# Driver bị treo sẽ ném TimeoutException sau khoảng này thay vì chặn worker mãi mãi
+PAGE_LOAD_TIMEOUT = 60
+
+# Lấy link và nội dung dòng của mọi dịch vụ trên trang danh sách trong một lần gọi
+SERVICE_ROWS_SCRIPT = """
+return Array.prototype.map.call(document.querySelectorAll(arguments[0]), function (link) {
+    var row = link.closest('li') || link;
+    return [link.href, (row.innerText || row.textContent || '').trim()];
+});
+"""
+
+# Đường dẫn chromedriver chỉ cần tải/giải quyết một lần cho toàn bộ tiến trình
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+
+def resolve_driver_path():
+    """Resolve the chromedriver binary once and reuse it for every driver"""
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            _driver_path = ChromeDriverManager().install()
+        return _driver_path
+
+
+def agency_listing_url(base_url, agency):
+    """The listing url with its pCoQuanId replaced by another agency id"""
+    parts = urlparse(base_url)
+    params = {key: values[0] for key, values in parse_qs(parts.query).items()}
+    params["pCoQuanId"] = str(agency)
+    return urlunparse(parts._replace(query=urlencode(params)))
+
+
+# Messages of generic WebDriverExceptions raised when Chrome itself has gone away
+SESSION_LOST_MESSAGES = ("chrome not reachable", "session deleted", "disconnected", "target window already closed")
+
+
+def classify_exception(error):
+    """Map an exception raised while extracting a service to a retry failure kind"""
+    if isinstance(error, TimeoutException):
+        return TIMEOUT
+    # Only a lost session (or a chromedriver that refuses connections) is a crash that warrants a new driver;
+    # stale, non-interactable or script errors come from the page and are retried as parse errors
+    if isinstance(error, (InvalidSessionIdException, NoSuchWindowException, ConnectionError,
+                          MaxRetryError, ProtocolError)):
+        return DRIVER_CRASH
+    if isinstance(error, WebDriverException) and any(
+            message in (error.msg or "").lower() for message in SESSION_LOST_MESSAGES):
+        return DRIVER_CRASH
+    return PARSE_ERROR
+
+
+def missing_popup(service_data):
+    """A record whose popup gave no field values is incomplete, even though extraction 'succeeded'"""
+    meta = service_data.get("meta") or {}
+    if not any(meta.get(field) for field, row_xpath in xpaths.POPUP_FIELDS):
+        return Failure(POPUP_MISSING, "detail popup returned no fields")
+    return None
+
+
+class ServiceTask:
+    """One service url travelling through the link queue, and back through the retry queue"""
+    def __init__(self, page_number, link, row_text=None):
+        self.page = page_number
+        self.link = link
+        self.row_text = row_text
+        self.attempt = 1
+        self.last_worker = None
+        # Bản ghi của lần chạy trước (chế độ incremental), dùng lại nếu mọi lần trích xuất đều thất bại
+        self.previous_record = None
+
+
+# Selectors handed to EXTRACT_SCRIPT so the in-browser extraction uses the same XPaths as the Python code
+EXTRACTION_SPEC = {
+    "title_css": xpaths.TITLE_CSS,
+    "popup_id": xpaths.POPUP_ID,
+    "popup_value_xpath": xpaths.POPUP_VALUE_XPATH,
+    "popup_fields": xpaths.POPUP_FIELDS,
+    "legal_basis_field": xpaths.LEGAL_BASIS_FIELD,
+    "legal_basis_row_xpaths": xpaths.LEGAL_BASIS_ROW_XPATHS,
+    "legal_basis_columns": xpaths.LEGAL_BASIS_COLUMNS,
+    "detail_sections": xpaths.DETAIL_SECTIONS,
+    "ho_so_items_xpath": xpaths.HO_SO_ITEMS_XPATH,
+    "ho_so_item_title_xpath": xpaths.HO_SO_ITEM_TITLE_XPATH,
+    "ho_so_item_content_xpath": xpaths.HO_SO_ITEM_CONTENT_XPATH,
+    "ho_so_item_titles": xpaths.HO_SO_ITEM_TITLES,
+    "detail_article_sections": xpaths.DETAIL_ARTICLE_SECTIONS,
+}
+
+# Collects the title, every popup field, the legal-basis table and every detail section
+# in one WebDriver round trip; returns a JSON string shaped like the Python extraction
+EXTRACT_SCRIPT = """
+var spec = arguments[0];
+var withPopup = arguments[1];
+
+function first(xpath, context) {
+    return document.evaluate(xpath, context || document, null,
+        XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+}
+function all(xpath, context) {
+    var snapshot = document.evaluate(xpath, context || document, null,
+        XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    var nodes = [];
+    for (var i = 0; i < snapshot.snapshotLength; i++) {
+        nodes.push(snapshot.snapshotItem(i));
+    }
+    return nodes;
+}
+function text(node) {
+    return (node.innerText || node.textContent || "").trim();
+}
+function firstText(xpathList) {
+    for (var i = 0; i < xpathList.length; i++) {
+        var node = first(xpathList[i]);
+        if (node) {
+            return text(node);
+        }
+    }
+    return "";
+}
+
+var titleNode = document.querySelector(spec.title_css);
+var result = {title: titleNode ? text(titleNode) : null, meta: null, details: {}};
+
+var popup = document.getElementById(spec.popup_id);
+if (withPopup && popup) {
+    var meta = {};
+    spec.popup_fields.forEach(function (field) {
+        var row = first(field[1], popup);
+        var value = row ? first(spec.popup_value_xpath, row) : null;
+        meta[field[0]] = value ? text(value) : "";
+    });
+
+    var rows = [];
+    for (var i = 0; i < spec.legal_basis_row_xpaths.length && rows.length === 0; i++) {
+        rows = all(spec.legal_basis_row_xpaths[i], popup);
+    }
+    var legalBasis = [];
+    rows.forEach(function (row) {
+        var cells = Array.prototype.map.call(row.getElementsByTagName("td"), text);
+        if (cells.length >= 3) {
+            var entry = {};
+            spec.legal_basis_columns.forEach(function (column, index) {
+                entry[column] = index < cells.length ? cells[index] : "";
+            });
+            legalBasis.push(entry);
+        }
+    });
+    meta[spec.legal_basis_field] = legalBasis;
+    result.meta = meta;
+}
+
+spec.detail_sections.forEach(function (section) {
+    result.details[section[0]] = firstText(section[1]);
+});
+
+var items = all(spec.ho_so_items_xpath);
+spec.ho_so_item_titles.forEach(function (itemTitle) {
+    for (var i = 0; i < items.length; i++) {
+        var titleElement = first(spec.ho_so_item_title_xpath, items[i]);
+        if (!titleElement) {
+            result.details[itemTitle] = "";
+            break;
+        }
+        if (text(titleElement).indexOf(itemTitle) !== -1) {
+            var content = first(spec.ho_so_item_content_xpath, items[i]);
+            result.details[itemTitle] = content ? text(content) : "";
+            break;
+        }
+    }
+});
+
+spec.detail_article_sections.forEach(function (section) {
+    result.details[section[0]] = firstText(section[1]);
+});
+
+return JSON.stringify(result);
+"""
+
 
 class ServiceWorker:
     """Worker class to handle individual service extraction with its own WebDriver instance"""
-    def __init__(self, worker_id):
+    def __init__(self, worker_id, driver_path=None, extraction_mode="elements", wait_stats=None, wait_timeouts=None,
+                 profile=None, traffic=None, metrics=None, cache=None):
         self.worker_id = worker_id
+        self.driver_path = driver_path or resolve_driver_path()
+        # "elements": one WebDriver call per field; "script": one execute_script per service
+        self.extraction_mode = extraction_mode
+        self.wait_stats = wait_stats
+        self.wait_timeouts = wait_timeouts
+        self.profile = profile or BrowserProfile()
+        self.traffic = traffic
+        self.metrics = metrics or Metrics()
+        # Lưu HTML gốc (trang chi tiết + popup) để có thể parse lại offline
+        self.cache = cache
+        self.captured_popup = None
+        # Lý do lần trích xuất gần nhất thất bại (None nếu thành công)
+        self.last_failure = None
+        self.health = WorkerHealth()
         self.init_driver()
         
     def init_driver(self):
-        # Set up Chrome options
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--window-size=1920,1080")
-        
-        # Initialize the WebDriver
+        # Initialize the WebDriver with the crawl's browser profile (full or lean)
         self.driver = webdriver.Chrome(
-            service=Service(ChromeDriverManager().install()),
-            options=chrome_options
+            service=Service(self.driver_path),
+            options=self.profile.chrome_options()
         )
-        self.wait = WebDriverWait(self.driver, 10)
+        self.profile.apply(self.driver)
+        self.driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+        self.driver.set_script_timeout(PAGE_LOAD_TIMEOUT)
+        self.waits = WaitEngine(self.driver, self.wait_stats, self.wait_timeouts)
+    
+    def browser_pid(self):
+        """Pid of chromedriver, whose process tree holds every Chrome process of this worker"""
+        try:
+            return self.driver.service.process.pid
+        except AttributeError:
+            return None
+    
+    def recycle(self):
+        """Replace the driver with a fresh one; the old one may already be dead"""
+        try:
+            self.driver.quit()
+        except Exception as e:
+            print(f"Worker {self.worker_id}: error quitting old driver: {e}")
+        self.init_driver()
+        self.health.reset()
+        self.health.recycles += 1
     
     def extract_service_detail_popup(self, service_title):
         """Extract detailed information from the popup window"""
         try:
-            # Wait for popup to be visible and extract data
-            popup = self.wait.until(EC.visibility_of_element_located((By.ID, "popupChitietTTHC")))
-            
-            # Extract additional information from popup
-            popup_data = {}
-            
-            # Extract procedure code
-            try:
-                procedure_code_row = popup.find_element(By.XPATH, ".//div[contains(@class, 'info-row')][1]")
-                procedure_code = procedure_code_row.find_element(By.XPATH, ".//div[2]").text.strip()
-                popup_data["Mã thủ tục"] = procedure_code
-            except NoSuchElementException:
-                popup_data["Mã thủ tục"] = ""
-            
-            # Extract decision number
-            try:
-                decision_row = popup.find_element(By.XPATH, ".//div[contains(@class, 'info-row')][2]")
-                decision_number = decision_row.find_element(By.XPATH, ".//div[2]").text.strip()
-                popup_data["Số quyết định"] = decision_number
-            except NoSuchElementException:
-                popup_data["Số quyết định"] = ""
-            
-            # Extract implementation level
-            try:
-                level_row = popup.find_element(By.XPATH, ".//div[contains(@class, 'info-row')][4]")
-                level = level_row.find_element(By.XPATH, ".//div[2]").text.strip()
-                popup_data["Cấp thực hiện"] = level
-            except NoSuchElementException:
-                popup_data["Cấp thực hiện"] = ""
-            
-            # Extract procedure type
-            try:
-                type_row = popup.find_element(By.XPATH, ".//div[contains(@class, 'info-row')][5]")
-                proc_type = type_row.find_element(By.XPATH, ".//div[2]").text.strip()
-                popup_data["Loại thủ tục"] = proc_type
-            except NoSuchElementException:
-                popup_data["Loại thủ tục"] = ""
+            with self.metrics.timer("popup_extract", self.worker_id):
+                # Wait for popup to be visible and extract data
+                popup = self.waits.until("popup_visible", WaitEngine.popup_visible)
+                if self.cache is not None:
+                    # Captured while visible: the modal may be emptied when it is closed
+                    self.captured_popup = popup.get_attribute("outerHTML")
+                
+                # Extract additional information from popup
+                popup_data = {}
+                for field, row_xpath in xpaths.POPUP_FIELDS:
+                    try:
+                        row = popup.find_element(By.XPATH, row_xpath)
+                        popup_data[field] = row.find_element(By.XPATH, xpaths.POPUP_VALUE_XPATH).text.strip()
+                    except NoSuchElementException:
+                        popup_data[field] = ""
+                    
+                # Extract legal basis
+                try:
+                    legal_basis_rows = []
+                    for rows_xpath in xpaths.LEGAL_BASIS_ROW_XPATHS:
+                        legal_basis_rows = popup.find_elements(By.XPATH, rows_xpath)
+                        if legal_basis_rows:
+                            break
+                    legal_basis_list = []
+                    for row in legal_basis_rows:
+                        try:
+                            cells = [cell.text.strip() for cell in row.find_elements(By.TAG_NAME, "td")]
+                            if len(cells) >= 3:
+                                legal_basis_list.append(xpaths.legal_basis_entry(cells))
+                        except Exception as e:
+                            continue
+                    popup_data[xpaths.LEGAL_BASIS_FIELD] = legal_basis_list
+                except Exception as e:
+                    popup_data[xpaths.LEGAL_BASIS_FIELD] = []
             
-            # Extract field
-            try:
-                field_row = popup.find_element(By.XPATH, ".//div[contains(@class, 'info-row')][6]")
-                field = field_row.find_element(By.XPATH, ".//div[2]").text.strip()
-                popup_data["Lĩnh vực"] = field
-            except NoSuchElementException:
-                popup_data["Lĩnh vực"] = ""
+            # Close the popup
+            with self.metrics.timer("popup_close", self.worker_id):
+                try:
+                    close_button = popup.find_element(By.XPATH, xpaths.POPUP_CLOSE_XPATH)
+                    close_button.click()
+                    self.waits.try_until("popup_hidden", WaitEngine.popup_hidden)
+                except Exception as e:
+                    print(f"Could not close popup for {service_title}: {e}")
+                    # Try to click elsewhere or press ESC
+                    try:
+                        self.driver.find_element(By.TAG_NAME, "body").send_keys('\ue00c')  # ESC key
+                        self.waits.try_until("popup_hidden", WaitEngine.popup_hidden)
+                    except:
+                        pass
             
-            # Extract subject
-            try:
-                subject_row = popup.find_element(By.XPATH, ".//div[contains(@class, 'info-row')][contains(.//div[1], 'Đối tượng thực hiện')]")
-                subject = subject_row.find_element(By.XPATH, ".//div[2]").text.strip()
-                popup_data["Đối tượng thực hiện"] = subject
-            except NoSuchElementException:
-                popup_data["Đối tượng thực hiện"] = ""
+            return popup_data
             
-            # Extract implementing agency
+        except Exception as e:
+            print(f"Error extracting popup details for {service_title}: {e}")
+            return {}
+
+    def find_first_text(self, xpath_list):
+        """Return the text of the first XPath that matches, trying fallbacks in order"""
+        for xpath in xpath_list:
             try:
-                agency_row = popup.find_element(By.XPATH, ".//div[contains(@class, 'info-row')][contains(.//div[1], 'Cơ quan thực hiện')]")
-                agency = agency_row.find_element(By.XPATH, ".//div[2]").text.strip()
-                popup_data["Cơ quan thực hiện"] = agency
+                return self.driver.find_element(By.XPATH, xpath).text.strip()
             except NoSuchElementException:
-                popup_data["Cơ quan thực hiện"] = ""
+                continue
+        return ""
+
+    def extract_service_details_script(self, service_url):
+        """Extract all fields of a service with a single in-browser script call"""
+        self.last_failure = None
+        try:
+            with self.metrics.timer("driver_get", self.worker_id):
+                self.driver.get(service_url)
+            self.waits.try_until("page_load", WaitEngine.network_idle)
             
-            # Extract authorized agency
+            # Click "Xem chi tiết" so the popup content is loaded before the script runs
+            popup_opened = False
             try:
-                authorized_row = popup.find_element(By.XPATH, ".//div[contains(@class, 'info-row')][contains(.//div[1], 'Cơ quan có thẩm quyền')]")
-                authorized = authorized_row.find_element(By.XPATH, ".//div[2]").text.strip()
-                popup_data["Cơ quan có thẩm quyền"] = authorized
-            except NoSuchElementException:
-                popup_data["Cơ quan có thẩm quyền"] = ""
+                with self.metrics.timer("popup_open", self.worker_id):
+                    detail_link = self.waits.until("popup_link", EC.element_to_be_clickable((By.CSS_SELECTOR, xpaths.POPUP_LINK_CSS)))
+                    detail_link.click()
+                    self.waits.try_until("popup_loaded", WaitEngine.popup_loaded)
+                    self.waits.until("popup_visible", WaitEngine.popup_visible)
+                popup_opened = True
+            except (TimeoutException, ElementClickInterceptedException) as e:
+                print(f"Could not open detail popup for {service_url}: {e}")
             
-            # Extract result
-            try:
-                result_row = popup.find_element(By.XPATH, ".//div[contains(@class, 'info-row')][contains(.//div[1], 'Kết quả thực hiện')]")
-                result = result_row.find_element(By.XPATH, ".//div[2]").text.strip()
-                popup_data["Kết quả thực hiện"] = result
-            except NoSuchElementException:
-                popup_data["Kết quả thực hiện"] = ""
-                
-            # Extract legal basis
-            try:
-                legal_basis_rows = popup.find_elements(By.XPATH, ".//div[contains(@class, 'info-row')][contains(.//div[1], 'Căn cứ pháp lý')]//table//tbody//tr")
-                legal_basis_list = []
-                for row in legal_basis_rows:
-                    try:
-                        cells = row.find_elements(By.TAG_NAME, "td")
-                        if len(cells) >= 3:
-                            doc_number = cells[0].text.strip()
-                            doc_title = cells[1].text.strip()
-                            doc_date = cells[2].text.strip()
-                            agency = cells[3].text.strip() if len(cells) > 3 else ""
-                            legal_basis_list.append({
-                                "Số ký hiệu": doc_number,
-                                "Trích yếu": doc_title,
-                                "Ngày ban hành": doc_date,
-                                "Cơ quan ban hành": agency
-                            })
-                    except Exception as e:
-                        continue
-                popup_data["Căn cứ pháp lý"] = legal_basis_list
-            except Exception as e:
-                popup_data["Căn cứ pháp lý"] = []
+            with self.metrics.timer("extract_script", self.worker_id):
+                extracted = json.loads(self.driver.execute_script(EXTRACT_SCRIPT, EXTRACTION_SPEC, popup_opened))
+            if self.cache is not None and popup_opened:
+                self.captured_popup = self.driver.find_element(By.XPATH, xpaths.POPUP_XPATH).get_attribute("outerHTML")
+            if extracted["title"] is None:
+                raise NoSuchElementException(f"No service title found at {service_url}")
             
-            # Close the popup
-            try:
-                close_button = popup.find_element(By.XPATH, ".//div[@class='close']//span[@class='-ap icon icon-close']")
-                close_button.click()
-                time.sleep(1)
-            except Exception as e:
-                print(f"Could not close popup for {service_title}: {e}")
-                # Try to click elsewhere or press ESC
-                try:
-                    self.driver.find_element(By.TAG_NAME, "body").send_keys('\ue00c')  # ESC key
-                    time.sleep(1)
-                except:
-                    pass
+            # The popup is left open: the next driver.get() discards it anyway
+            service_data = {
+                "title": extracted["title"],
+                "url": service_url,
+                "details": extracted["details"],
+                "meta": extracted["meta"] or {}
+            }
             
-            return popup_data
+            print(f"Worker {self.worker_id}: Extracted details for: {service_data['title']}")
+            return service_data
             
         except Exception as e:
-            print(f"Error extracting popup details for {service_title}: {e}")
-            return {}
+            print(f"Worker {self.worker_id}: Error extracting service details: {e}")
+            self.last_failure = Failure(classify_exception(e), e)
+            return None
 
     def extract_service_details(self, service_url):
         """Extract detailed information for a specific service"""
+        self.captured_popup = None
+        try:
+            if self.extraction_mode == "script":
+                service_data = self.extract_service_details_script(service_url)
+            else:
+                service_data = self.extract_service_details_elements(service_url)
+            if service_data is not None and self.cache is not None:
+                self.capture_html(service_url)
+            return service_data
+        finally:
+            if self.traffic is not None:
+                received, finished, blocked = self.traffic.measure(self.worker_id, self.driver, service_url)
+                print(f"Worker {self.worker_id}: {received / 1024:.1f} KB in {finished} requests "
+                      f"({blocked} blocked) for {service_url}")
+
+    def capture_html(self, service_url):
+        """Store the rendered page and popup HTML the record was extracted from"""
         try:
-            self.driver.get(service_url)
-            time.sleep(2)  # Wait for page to load
+            with self.metrics.timer("html_capture", self.worker_id):
+                self.cache.store(service_url, self.driver.page_source, self.captured_popup)
+        except Exception as e:
+            print(f"Worker {self.worker_id}: could not cache HTML of {service_url}: {e}")
+
+    def extract_service_details_elements(self, service_url):
+        """Extract a service with one WebDriver call per field"""
+        self.last_failure = None
+        try:
+            with self.metrics.timer("driver_get", self.worker_id):
+                self.driver.get(service_url)
+            self.waits.try_until("page_load", WaitEngine.network_idle)
             
             # Get service title
-            service_title = self.driver.find_element(By.CSS_SELECTOR, "h1.main-title.-none").text.strip()
+            service_title = self.driver.find_element(By.CSS_SELECTOR, xpaths.TITLE_CSS).text.strip()
             
             # Initialize service data
             service_data = {
@@ -177,9 +423,10 @@ class ServiceWorker:
             
             # Click "Xem chi tiết" to open popup
             try:
-                detail_link = self.wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "a.url[data-toggle='modal']")))
-                detail_link.click()
-                time.sleep(2)  # Wait for popup to load
+                with self.metrics.timer("popup_open", self.worker_id):
+                    detail_link = self.waits.until("popup_link", EC.element_to_be_clickable((By.CSS_SELECTOR, xpaths.POPUP_LINK_CSS)))
+                    detail_link.click()
+                    self.waits.try_until("popup_loaded", WaitEngine.popup_loaded)
                 
                 # Extract data from popup
                 popup_data = self.extract_service_detail_popup(service_title)
@@ -188,106 +435,36 @@ class ServiceWorker:
                 print(f"Could not open detail popup for {service_title}: {e}")
                 service_data["meta"] = {}
             
-            # Extract "Trình tự thực hiện"
-            try:
-                trinh_tu_element = self.driver.find_element(By.XPATH, "//h2[contains(text(), 'Trình tự thực hiện')]/following-sibling::div")
-                trinh_tu_content = trinh_tu_element.text.strip()
-                service_data["details"]["Trình tự thực hiện"] = trinh_tu_content
-            except NoSuchElementException:
-                service_data["details"]["Trình tự thực hiện"] = ""
-            
-            # Extract "Cách thức thực hiện"
-            try:
-                cach_thuc_element = self.driver.find_element(By.XPATH, "//h2[contains(text(), 'Cách thức thực hiện')]/following-sibling::table")
-                cach_thuc_content = cach_thuc_element.text.strip()
-                service_data["details"]["Cách thức thực hiện"] = cach_thuc_content
-            except NoSuchElementException:
-                service_data["details"]["Cách thức thực hiện"] = ""
+            # Extract "Trình tự thực hiện", "Cách thức thực hiện", "Thành phần hồ sơ"
+            for field, xpath_list in xpaths.DETAIL_SECTIONS:
+                with self.metrics.timer(f"section:{field}", self.worker_id):
+                    service_data["details"][field] = self.find_first_text(xpath_list)
             
-            # Extract "Thành phần hồ sơ"
-            try:
-                thanh_phan_element = self.driver.find_element(By.XPATH, "//h2[contains(text(), 'Thành phần hồ sơ')]/following-sibling::div[@class='list-expand']")
-                thanh_phan_content = thanh_phan_element.text.strip()
-                service_data["details"]["Thành phần hồ sơ"] = thanh_phan_content
-            except NoSuchElementException:
-                service_data["details"]["Thành phần hồ sơ"] = ""
-            
-            # Extract "Giấy tờ phải nộp"
-            try:
-                # Find all list-expand divs in the "Thành phần hồ sơ" section
-                ho_so_items = self.driver.find_elements(By.XPATH, "//h2[contains(text(), 'Thành phần hồ sơ')]/following-sibling::div[@class='list-expand']/div[@class='item']")
-                for item in ho_so_items:
-                    title_element = item.find_element(By.XPATH, ".//div[@class='title']")
-                    title_text = title_element.text.strip()
-                    if "Giấy tờ phải nộp" in title_text:
-                        content_element = item.find_element(By.XPATH, ".//div[@class='content']")
-                        content_text = content_element.text.strip()
-                        service_data["details"]["Giấy tờ phải nộp"] = content_text
-                        break
-            except NoSuchElementException:
-                service_data["details"]["Giấy tờ phải nộp"] = ""
-            
-            # Extract "Giấy tờ phải xuất trình"
-            try:
-                ho_so_items = self.driver.find_elements(By.XPATH, "//h2[contains(text(), 'Thành phần hồ sơ')]/following-sibling::div[@class='list-expand']/div[@class='item']")
-                for item in ho_so_items:
-                    title_element = item.find_element(By.XPATH, ".//div[@class='title']")
-                    title_text = title_element.text.strip()
-                    if "Giấy tờ phải xuất trình" in title_text:
-                        content_element = item.find_element(By.XPATH, ".//div[@class='content']")
-                        content_text = content_element.text.strip()
-                        service_data["details"]["Giấy tờ phải xuất trình"] = content_text
-                        break
-            except NoSuchElementException:
-                service_data["details"]["Giấy tờ phải xuất trình"] = ""
+            # Extract "Giấy tờ phải nộp", "Giấy tờ phải xuất trình", "Lưu ý" from the list-expand items
+            ho_so_items = self.driver.find_elements(By.XPATH, xpaths.HO_SO_ITEMS_XPATH)
+            for item_title in xpaths.HO_SO_ITEM_TITLES:
+                with self.metrics.timer(f"section:{item_title}", self.worker_id):
+                    try:
+                        for item in ho_so_items:
+                            title_text = item.find_element(By.XPATH, xpaths.HO_SO_ITEM_TITLE_XPATH).text.strip()
+                            if item_title in title_text:
+                                content_element = item.find_element(By.XPATH, xpaths.HO_SO_ITEM_CONTENT_XPATH)
+                                service_data["details"][item_title] = content_element.text.strip()
+                                break
+                    except NoSuchElementException:
+                        service_data["details"][item_title] = ""
             
-            # Extract "Lưu ý"
-            try:
-                ho_so_items = self.driver.find_elements(By.XPATH, "//h2[contains(text(), 'Thành phần hồ sơ')]/following-sibling::div[@class='list-expand']/div[@class='item']")
-                for item in ho_so_items:
-                    title_element = item.find_element(By.XPATH, ".//div[@class='title']")
-                    title_text = title_element.text.strip()
-                    if "Lưu ý" in title_text:
-                        content_element = item.find_element(By.XPATH, ".//div[@class='content']")
-                        content_text = content_element.text.strip()
-                        service_data["details"]["Lưu ý"] = content_text
-                        break
-            except NoSuchElementException:
-                service_data["details"]["Lưu ý"] = ""
-            
-            # Extract "Cơ quan thực hiện"
-            try:
-                co_quan_element = self.driver.find_element(By.XPATH, "//div[contains(@class, 'item')]/div[contains(@class, 'title') and contains(text(), 'Cơ quan thực hiện')]/following-sibling::div[@class='content']/div[@class='article']")
-                co_quan_content = co_quan_element.text.strip()
-                service_data["details"]["Cơ quan thực hiện"] = co_quan_content
-            except NoSuchElementException:
-                try:
-                    # Alternative way to find the element
-                    co_quan_element = self.driver.find_element(By.XPATH, "//h2[contains(text(), 'Cơ quan thực hiện')]/following-sibling::div[@class='article']")
-                    co_quan_content = co_quan_element.text.strip()
-                    service_data["details"]["Cơ quan thực hiện"] = co_quan_content
-                except NoSuchElementException:
-                    service_data["details"]["Cơ quan thực hiện"] = ""
-            
-            # Extract "Yêu cầu, điều kiện thực hiện"
-            try:
-                yeu_cau_element = self.driver.find_element(By.XPATH, "//div[contains(@class, 'item')]/div[contains(@class, 'title') and contains(text(), 'Yêu cầu, điều kiện')]/following-sibling::div[@class='content']/div[@class='article cls-requires']")
-                yeu_cau_content = yeu_cau_element.text.strip()
-                service_data["details"]["Yêu cầu, điều kiện thực hiện"] = yeu_cau_content
-            except NoSuchElementException:
-                try:
-                    # Alternative way to find the element
-                    yeu_cau_element = self.driver.find_element(By.XPATH, "//h2[contains(text(), 'Yêu cầu, điều kiện thực hiện')]/following-sibling::div[@class='article']")
-                    yeu_cau_content = yeu_cau_element.text.strip()
-                    service_data["details"]["Yêu cầu, điều kiện thực hiện"] = yeu_cau_content
-                except NoSuchElementException:
-                    service_data["details"]["Yêu cầu, điều kiện thực hiện"] = ""
+            # Extract "Cơ quan thực hiện", "Yêu cầu, điều kiện thực hiện" (with alternative locations)
+            for field, xpath_list in xpaths.DETAIL_ARTICLE_SECTIONS:
+                with self.metrics.timer(f"section:{field}", self.worker_id):
+                    service_data["details"][field] = self.find_first_text(xpath_list)
             
             print(f"Worker {self.worker_id}: Extracted details for: {service_title}")
             return service_data
             
         except Exception as e:
             print(f"Worker {self.worker_id}: Error extracting service details: {e}")
+            self.last_failure = Failure(classify_exception(e), e)
             return None
     
     def close(self):
@@ -296,47 +473,206 @@ class ServiceWorker:
             self.driver.quit()
 
 
-class HoaBinhServiceCrawler:
-    def __init__(self, max_workers=4):
-        self.base_url = "https://dichvucong.gov.vn/p/home/dvc-dich-vu-cong-truc-tuyen-ds.html?pCoQuanId=387628"
-        self.data = []
-        self.max_workers = max_workers  # Số lượng worker tối đa
-        self.data_lock = threading.Lock()  # Lock để bảo vệ việc ghi dữ liệu
+class DriverPool:
+    """Long-lived pool of pre-warmed ServiceWorker instances shared across all pages"""
+    def __init__(self, size, extraction_mode="elements", wait_stats=None, wait_timeouts=None, profile=None, traffic=None,
+                 health_policy=None, metrics=None, cache=None):
+        self.size = size
+        self.cache = cache
+        self.metrics = metrics
+        self.profile = profile
+        self.traffic = traffic
+        self.health_policy = health_policy
+        self.extraction_mode = extraction_mode
+        self.wait_stats = wait_stats
+        self.wait_timeouts = wait_timeouts
+        self.workers = []
+        self.idle = []
+        self.idle_changed = threading.Condition()
+        self.started = False
+        self.lock = threading.Lock()
+        self.stats = {
+            "driver_path_seconds": 0.0,
+            "startup_seconds": 0.0,
+            "launch_seconds": [],
+            "shutdown_seconds": 0.0,
+            "acquisitions": 0,
+            "recycles": 0,
+            "recycle_seconds": 0.0,
+        }
+
+    def start(self):
+        """Resolve the driver binary once and launch all drivers in parallel"""
+        with self.lock:
+            if self.started:
+                return
+            start_time = time.time()
+            driver_path = resolve_driver_path()
+            self.stats["driver_path_seconds"] = time.time() - start_time
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.size) as executor:
+                futures = [executor.submit(self._launch, i, driver_path) for i in range(self.size)]
+                for future in concurrent.futures.as_completed(futures):
+                    try:
+                        worker = future.result()
+                    except Exception as e:
+                        print(f"Could not start worker driver: {e}")
+                        continue
+                    self.workers.append(worker)
+                    self.release(worker)
+
+            if not self.workers:
+                raise RuntimeError("Could not start any worker driver")
+
+            self.stats["startup_seconds"] = time.time() - start_time
+            self.started = True
+            print(f"Driver pool started {len(self.workers)}/{self.size} drivers in {self.stats['startup_seconds']:.2f}s")
+
+    def _launch(self, worker_id, driver_path):
+        launch_start = time.time()
+        worker = ServiceWorker(worker_id, driver_path, self.extraction_mode, self.wait_stats, self.wait_timeouts,
+                               self.profile, self.traffic, self.metrics, self.cache)
+        self.stats["launch_seconds"].append(time.time() - launch_start)
+        return worker
+
+    def acquire(self, avoid=None):
+        """Block until an idle worker is available and hand it out, never the worker with id ``avoid``
+
+        A retried service passes the id of the worker it failed on; with a single
+        worker in the pool there is no other choice and ``avoid`` is ignored.
+        """
+        self.start()
+        with self.idle_changed:
+            while True:
+                candidates = [worker for worker in self.idle if worker.worker_id != avoid or len(self.workers) == 1]
+                if candidates:
+                    break
+                if not self.workers:
+                    raise RuntimeError("No worker driver left in the pool")
+                self.idle_changed.wait()
+            worker = candidates[0]
+            self.idle.remove(worker)
+        with self.lock:
+            self.stats["acquisitions"] += 1
+        return worker
+
+    def release(self, worker):
+        """Return a worker to the idle set, recycling its driver first when it is unhealthy"""
+        if self.health_policy is not None and self.started:
+            reason = self.health_policy.recycle_reason(worker.health, worker.browser_pid())
+            if reason is not None and not self.recycle(worker, *reason):
+                return
+        with self.idle_changed:
+            self.idle.append(worker)
+            self.idle_changed.notify_all()
+
+    def recycle(self, worker, kind, description):
+        """Restart a worker's driver; a worker that cannot be restarted leaves the pool"""
+        print(f"Recycling driver of worker {worker.worker_id} ({description}, "
+              f"{worker.health.served} services served)")
+        start_time = time.time()
+        try:
+            worker.recycle()
+        except Exception as e:
+            print(f"Could not restart driver of worker {worker.worker_id}: {e}")
+            with self.idle_changed:
+                self.workers.remove(worker)
+                self.idle_changed.notify_all()
+            return False
+        self.health_policy.count(kind)
+        with self.lock:
+            self.stats["recycles"] += 1
+            self.stats["recycle_seconds"] += time.time() - start_time
+        return True
+
+    @contextlib.contextmanager
+    def worker(self, avoid=None):
+        worker = self.acquire(avoid)
+        try:
+            yield worker
+        finally:
+            self.release(worker)
+
+    def close(self):
+        """Quit every driver in parallel"""
+        with self.lock:
+            if not self.workers:
+                return
+            start_time = time.time()
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(self.workers)) as executor:
+                for future in [executor.submit(worker.close) for worker in self.workers]:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        print(f"Error closing worker driver: {e}")
+            self.stats["shutdown_seconds"] = time.time() - start_time
+            self.workers = []
+            with self.idle_changed:
+                self.idle = []
+            self.started = False
+
+    def print_stats(self):
+        """Print start-up and shutdown statistics of the pool"""
+        launches = self.stats["launch_seconds"]
+        average_launch = sum(launches) / len(launches) if launches else 0.0
+        print("Driver pool stats:")
+        print(f"  Driver binary resolved in {self.stats['driver_path_seconds']:.2f}s")
+        print(f"  {len(launches)} drivers launched in {self.stats['startup_seconds']:.2f}s "
+              f"(avg {average_launch:.2f}s, max {max(launches, default=0.0):.2f}s per driver)")
+        print(f"  Workers handed out: {self.stats['acquisitions']}")
+        if self.health_policy is not None:
+            reasons = ", ".join(f"{kind} {count}" for kind, count in self.health_policy.recycle_reasons.items())
+            print(f"  Drivers recycled: {self.stats['recycles']} in {self.stats['recycle_seconds']:.2f}s"
+                  + (f" ({reasons})" if reasons else ""))
+        print(f"  Shutdown took {self.stats['shutdown_seconds']:.2f}s")
+
+
+class ListingDriver:
+    """A Chrome instance on the listing page: page size, AJAX pagination and link collection"""
+    def __init__(self, base_url, profile=None, wait_stats=None, wait_timeouts=None):
+        self.base_url = base_url
+        self.profile = profile or BrowserProfile()
         self.total_records = 0
+        self.current_page = None
+        self.driver = webdriver.Chrome(
+            service=Service(resolve_driver_path()),
+            options=self.profile.chrome_options()
+        )
+        self.profile.apply(self.driver)
+        self.waits = WaitEngine(self.driver, wait_stats, wait_timeouts)
         
-        # Khởi tạo driver chính để quét toàn bộ danh sách
-        self.init_main_driver()
+    def open_listing(self):
+        """Load the listing page, switch to 50 records per page and return the total page count"""
+        self.driver.get(self.base_url)
+        self.waits.try_until("listing_ready", WaitEngine.listing_ready)
         
-    def init_main_driver(self):
-        """Initialize the main WebDriver for pagination and link collection"""
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--window-size=1920,1080")
+        # Thiết lập kích thước trang và lấy tổng số trang
+        page_size_select = self.driver.find_element(By.CSS_SELECTOR, "#pageSize")
+        for option in page_size_select.find_elements(By.TAG_NAME, "option"):
+            if option.text == str(LISTING_PAGE_SIZE):
+                option.click()
+                self.waits.try_until("page_size", WaitEngine.page_size_applied(LISTING_PAGE_SIZE))
+                break
         
-        self.driver = webdriver.Chrome(
-            service=Service(ChromeDriverManager().install()),
-            options=chrome_options
-        )
-        self.wait = WebDriverWait(self.driver, 10)
+        self.current_page = 1
+        return self.get_total_pages()
         
     def navigate_to_page(self, page_number):
         """Navigate to a specific page number"""
         try:
+            previous_first_link = WaitEngine.first_service_link(self.driver)
             script = f"doSearch({page_number});"
             self.driver.execute_script(script)
             
-            # Đợi đủ thời gian để trang tải dữ liệu qua AJAX
-            time.sleep(5)
+            # Đợi đến khi trang đánh dấu active đổi và danh sách được thay bằng dữ liệu AJAX mới
+            self.waits.try_until("page_change", WaitEngine.page_changed(page_number, previous_first_link))
             
             # Xác minh rằng trang đã thay đổi
             try:
-                active_page = self.wait.until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, ".pagination .active"))
-                )
+                active_page = self.driver.find_element(By.CSS_SELECTOR, ".pagination .active")
                 if active_page.text.strip() == str(page_number):
                     print(f"Đã chuyển thành công đến trang {page_number}")
+                    self.current_page = page_number
                     return True
                 else:
                     print(f"Trang hiện tại là {active_page.text} thay vì {page_number}")
@@ -344,9 +680,10 @@ class HoaBinhServiceCrawler:
                 pass
                 
             # Kiểm tra xem danh sách dịch vụ có được tải không
-            service_elements = self.driver.find_elements(By.CSS_SELECTOR, "ul.list-document li a")
+            service_elements = self.driver.find_elements(By.CSS_SELECTOR, xpaths.SERVICE_LINK_CSS)
             if service_elements:
                 print(f"Tìm thấy {len(service_elements)} dịch vụ trên trang {page_number}")
+                self.current_page = page_number
                 return True
             else:
                 print(f"Không tìm thấy dịch vụ nào trên trang {page_number}")
@@ -358,11 +695,15 @@ class HoaBinhServiceCrawler:
             
     def get_service_links(self):
         """Get all service links on the current page"""
+        return [link for link, row_text in self.get_service_rows()]
+            
+    def get_service_rows(self):
+        """Get (link, listing row text) for every service on the current page in one script call"""
         try:
-            service_elements = self.wait.until(
-                EC.presence_of_all_elements_located((By.CSS_SELECTOR, "ul.list-document li a"))
+            self.waits.until(
+                "service_links", EC.presence_of_all_elements_located((By.CSS_SELECTOR, xpaths.SERVICE_LINK_CSS))
             )
-            return [element.get_attribute("href") for element in service_elements]
+            return [tuple(row) for row in self.driver.execute_script(SERVICE_ROWS_SCRIPT, xpaths.SERVICE_LINK_CSS)]
         except TimeoutException:
             print("Could not find service links on current page")
             return []
@@ -381,132 +722,723 @@ class HoaBinhServiceCrawler:
         except Exception as e:
             print(f"Error getting total pages: {e}")
             return 0
-    
-    def process_service_batch(self, service_links, page_number):
-        """Process a batch of service links with multiple threads"""
-        # Tạo queue chứa các service links
-        service_queue = queue.Queue()
-        for link in service_links:
-            service_queue.put(link)
-        
-        # Khởi tạo list để lưu trữ result của mỗi thread
-        results = []
-        
-        # Tạo và khởi động các worker threads
-        threads = []
-        workers = []
-        
-        for i in range(min(self.max_workers, len(service_links))):
-            worker = ServiceWorker(i)
-            workers.append(worker)
-            
-            thread = threading.Thread(
-                target=self.worker_thread_function,
-                args=(worker, service_queue, results)
-            )
-            thread.daemon = True
-            threads.append(thread)
-            thread.start()
+            
+    def close(self):
+        self.driver.quit()
+
+
+class HoaBinhServiceCrawler:
+    def __init__(self, max_workers=4, queue_size=100, engine="selenium", selenium_fallback=True,
+                 popup_url_template=None, base_url=None, extraction_mode="elements", wait_timeouts=None,
+                 output_name="hoabinh_services", compression=None, consolidate_output=True,
+                 state_path="hoabinh_crawl_state.db", state_journal="WAL", resume=True, incremental=False,
+                 min_workers=1, rate_limit=None, target_latency=10.0, max_attempts=3, retry_delay=5.0,
+                 browser_profile=None, health_policy=None, metrics_port=None, metrics_snapshot=None,
+                 metrics_interval=30.0, listing_drivers=1, search_url_template=None, agencies=None,
+                 html_cache=None, export_format=None):
+        self.base_url = base_url or "https://dichvucong.gov.vn/p/home/dvc-dich-vu-cong-truc-tuyen-ds.html?pCoQuanId=387628"
+        # Kết quả được ghi ngay vào stream JSON Lines thay vì giữ toàn bộ trong bộ nhớ
+        self.output_name = output_name
+        self.compression = compression
+        self.stream_path = stream_path(output_name, compression)
+        self.consolidate_output = consolidate_output
+        # Xuất thêm các bảng chuẩn hóa (SQLite hoặc Parquet) bên cạnh file JSON
+        self.export_format = export_format
+        self.flush_every = 1 if compression is None else 50
+        self.sink = None
+        self.extracted_count = 0
+        # Trạng thái từng URL được lưu bền vững để có thể tiếp tục khi tiến trình bị dừng
+        self.state_path = state_path
+        self.state_journal = state_journal
+        self.resume = resume
+        self.state = None
+        self.resumed = False
+        self.completed_urls = set()
+        self.queued_urls = set()
+        # Chế độ incremental: chỉ trích xuất lại các dịch vụ mới hoặc đã thay đổi
+        self.incremental = incremental
+        self.change_detector = None
+        self.max_workers = max_workers  # Số lượng worker tối đa
+        self.data_lock = threading.Lock()  # Lock để bảo vệ việc ghi dữ liệu
+        self.total_records = 0
+        # Thời gian chờ thực tế của từng điều kiện, dùng chung cho driver chính và các worker
+        self.wait_stats = WaitStats()
+        self.wait_timeouts = wait_timeouts
+        # Cấu hình Chrome (full hoặc lean) và bộ đếm dung lượng tải về theo trang/worker
+        self.profile = browser_profile or BrowserProfile()
+        self.traffic = TrafficStats()
+        # Driver của worker được khởi động lại khi tốn quá nhiều bộ nhớ, lỗi liên tiếp hoặc bị crash
+        self.health_policy = health_policy or HealthPolicy()
+        # Thời gian từng giai đoạn, số dịch vụ và lỗi theo worker; xuất qua Prometheus hoặc file JSON định kỳ
+        self.metrics = Metrics()
+        self.metrics_port = metrics_port
+        self.metrics_snapshot = metrics_snapshot
+        self.metrics_interval = metrics_interval
+        self.metrics_exporters = []
+        # Cache HTML theo nội dung (content-addressed) để parse lại mà không cần crawl lại
+        self.html_cache = HtmlCache(html_cache) if html_cache else None
         
-        # Đợi tất cả các thread hoàn thành
-        for thread in threads:
-            thread.join()
+        # Giới hạn tốc độ theo host và tự điều chỉnh số worker hoạt động (AIMD) trong khoảng [min_workers, max_workers]
+        self.scheduler = Scheduler(min_workers, max_workers, rate_per_host=rate_limit, target_latency=target_latency)
+        
+        # Engine trích xuất: "selenium" (mặc định) hoặc "http" (không cần trình duyệt cho trang chi tiết)
+        if engine not in ("selenium", "http"):
+            raise ValueError(f"Unknown extraction engine: {engine}")
+        self.engine = engine
+        self.selenium_fallback = selenium_fallback
+        self.popup_url_template = popup_url_template
+        if engine == "http":
+            from http_engine import HttpServiceExtractor
+            self.http_extractor = HttpServiceExtractor(pool_size=max_workers, popup_url_template=popup_url_template,
+                                                       cache=self.html_cache, throttle=self.scheduler.throttle)
+            # Selenium chỉ còn là phương án dự phòng, pool được khởi động khi cần
+            self.pool = DriverPool(1, extraction_mode, self.wait_stats, wait_timeouts, self.profile, self.traffic,
+                                   self.health_policy, self.metrics, self.html_cache)
+        else:
+            self.http_extractor = None
+            # Pool driver dùng chung cho mọi trang, chỉ khởi động một lần
+            self.pool = DriverPool(max_workers, extraction_mode, self.wait_stats, wait_timeouts, self.profile, self.traffic,
+                                   self.health_policy, self.metrics, self.html_cache)
+        # Queue giới hạn kích thước giữa driver phân trang và các worker (backpressure)
+        self.link_queue = queue.Queue(maxsize=queue_size)
+        # Dịch vụ lỗi được thử lại sau một khoảng chờ tăng dần; quá max_attempts thì ghi vào file dead-letter
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.retry_queue = None
+        self.dead_letter_path = f"{output_name}_dead_letter.jsonl"
+        self.dead_letter = None
+        # Thu thập trang danh sách song song: nhiều driver danh sách và/hoặc gọi thẳng endpoint tìm kiếm
+        self.listing_drivers = max(1, listing_drivers)
+        self.search_url_template = search_url_template
+        # Nhiều cơ quan (pCoQuanId) dùng chung pool worker; mỗi URL chỉ trích xuất một lần rồi liên kết với mọi cơ quan
+        self.agencies = [str(agency) for agency in agencies] if agencies else None
+        self.current_agency = None
+        self.page_extracted = {}
+        self.page_pending = {}
+        
+        # Khởi tạo driver chính để quét toàn bộ danh sách
+        self.init_main_driver()
+        
+    def init_main_driver(self):
+        """Initialize the main WebDriver for pagination and link collection"""
+        self.listing = ListingDriver(self.base_url, self.profile, self.wait_stats, self.wait_timeouts)
+        self.driver = self.listing.driver
+        self.waits = self.listing.waits
+        
+    def navigate_to_page(self, page_number):
+        """Navigate to a specific page number"""
+        return self.listing.navigate_to_page(page_number)
+        
+    def get_service_links(self):
+        """Get all service links on the current page"""
+        return self.listing.get_service_links()
+        
+    def get_service_rows(self):
+        """Get (link, listing row text) for every service on the current page"""
+        return self.listing.get_service_rows()
+        
+    def get_total_pages(self):
+        """Get the total number of pages"""
+        total_pages = self.listing.get_total_pages()
+        self.total_records = self.listing.total_records
+        return total_pages
+        
+    def open_listing(self):
+        """Load the listing page, switch to 50 records per page and return the total page count"""
+        total_pages = self.listing.open_listing()
+        self.total_records = self.listing.total_records
+        print(f"Total records: {self.total_records}, Total pages: {total_pages}")
+        return total_pages
+        
+    def register_page(self, page_number, service_links):
+        """Record how many links of a page are still waiting for extraction"""
+        with self.data_lock:
+            self.page_extracted[page_number] = 0
+            self.page_pending[page_number] = len(service_links)
             
-        # Đóng tất cả các worker
-        for worker in workers:
-            worker.close()
+    def record_result(self, page_number, service_data):
+        """Append one extracted service to the output stream and track page completion"""
+        if service_data:
+            self.sink.write(service_data)
             
-        # Thêm kết quả vào danh sách dữ liệu chính
         with self.data_lock:
-            self.data.extend(results)
-            
-        # Lưu dữ liệu trang hiện tại
-        self.save_data(f"hoabinh_services_page_{page_number}.json", results)
+            if service_data:
+                self.extracted_count += 1
+                self.page_extracted[page_number] += 1
+            self.page_pending[page_number] -= 1
+            page_completed = self.page_pending[page_number] == 0
+            if page_completed:
+                extracted = self.page_extracted.pop(page_number)
+                del self.page_pending[page_number]
+                
+        if page_completed:
+            if page_number == RESUME_PAGE:
+                print(f"Processed {extracted} services left unfinished by the previous run")
+            elif page_number == REPLAY_PAGE:
+                print(f"Processed {extracted} replayed services")
+            else:
+                print(f"Processed {extracted} services from page {page_number}")
         
-        return len(results)
+    def extract(self, task):
+        """Extract one service through the scheduler (rate limit and adaptive concurrency)
+
+        Returns (service_data, failure); failure is None only for a complete record.
+        """
+        with self.scheduler.slot(task.link) as slot:
+            service_data, failure = self.extract_with_engine(task)
+            slot.ok = failure is None
+            return service_data, failure
         
-    def worker_thread_function(self, worker, service_queue, results):
-        """Function executed by each worker thread"""
-        while not service_queue.empty():
-            try:
-                # Lấy service link từ queue
-                link = service_queue.get(block=False)
-                
-                # Trích xuất thông tin chi tiết
+    def extract_with_engine(self, task):
+        """Extract one service with the selected engine, falling back to Selenium when needed"""
+        link = task.link
+        if self.http_extractor is not None:
+            with self.metrics.timer("service", "http"):
+                service_data = self.http_extractor.extract_service_details(link)
+            if (service_data and service_data["meta"]) or not self.selenium_fallback:
+                if service_data is None:
+                    failure = self.http_extractor.last_failure or Failure(PARSE_ERROR, "extraction returned no data")
+                else:
+                    failure = missing_popup(service_data)
+                self.metrics.increment("services", "http", result=failure.kind if failure else "ok")
+                return service_data, failure
+            print(f"Falling back to Selenium for {link}")
+            # Lần tải lại bằng Selenium là một request nữa tới cùng host
+            self.scheduler.throttle(link)
+            
+        # Lần thử lại được giao cho một worker khác với worker đã thất bại
+        with self.pool.worker(avoid=task.last_worker) as worker:
+            task.last_worker = worker.worker_id
+            with self.metrics.timer("service", worker.worker_id):
                 service_data = worker.extract_service_details(link)
-                
-                # Nếu trích xuất thành công, thêm vào danh sách kết quả
-                if service_data:
-                    results.append(service_data)
-                    
-                # Đánh dấu task đã hoàn thành
-                service_queue.task_done()
-                
-            except queue.Empty:
+            if service_data is None:
+                failure = worker.last_failure or Failure(PARSE_ERROR, "extraction returned no data")
+            else:
+                failure = missing_popup(service_data)
+            self.metrics.increment("services", worker.worker_id, result=failure.kind if failure else "ok")
+            # Checked by the pool when the worker is released
+            worker.health.record(failure)
+            return service_data, failure
+        
+    def process_task(self, task):
+        """Extract one service, or reuse its previous record when the incremental checks find no change"""
+        link, row_text = task.link, task.row_text
+        if self.change_detector is None:
+            service_data, failure = self.extract(task)
+            if failure is None:
+                # Luôn lưu fingerprint để lần chạy incremental sau có dữ liệu so sánh
+                row_hash = text_hash(row_text) if row_text is not None else None
+                self.state.save_fingerprint(link, row_hash, decision_number(service_data), None, service_data)
+            return service_data, failure
+            
+        status, previous_record, content_hash = self.change_detector.check(link, row_text)
+        task.previous_record = previous_record
+        if status == UNCHANGED:
+            self.change_detector.record_unchanged(via_content=content_hash is not None)
+            return previous_record, None
+            
+        service_data, failure = self.extract(task)
+        if failure is None:
+            self.change_detector.remember(link, row_text, service_data, status, previous_record,
+                                          content_hash, compute_hash=True)
+        return service_data, failure
+        
+    def consume_links(self):
+        """Consumer thread: drain the link queue until a sentinel arrives"""
+        while True:
+            item = self.link_queue.get()
+            if item is None:
+                self.link_queue.task_done()
                 break
+            
+            task = item
+            service_data, failure = None, None
+            self.state.mark_in_flight(task.link)
+            try:
+                service_data, failure = self.process_task(task)
             except Exception as e:
                 print(f"Error in worker thread: {e}")
+                failure = Failure(classify_exception(e), e)
+            
+            try:
+                # Scheduled before task_done(), so link_queue.join() cannot miss a pending retry
+                # A crashed driver is replaced before its next service, so its URL is re-queued without backoff
+                delay = 0 if failure is not None and failure.kind == DRIVER_CRASH else None
+                if failure is not None and self.retry_queue.schedule(task, failure, delay):
+                    self.state.mark_pending(task.link, task.page)
+                    continue
+                
+                if failure is not None:
+                    self.dead_letter.write(task, failure, service_data)
+                # Bản ghi thiếu popup chỉ nằm trong file dead-letter: stream giữ bản đầu tiên của mỗi URL,
+                # nên nếu ghi vào đây thì bản đầy đủ từ --replay sẽ không bao giờ thay thế được nó
+                output_record = service_data if failure is None else None
+                if failure is not None and task.previous_record is not None:
+                    # Lỗi tạm thời không được làm mất dịch vụ khỏi bộ dữ liệu gộp: giữ bản ghi cũ, báo là stale
+                    output_record = task.previous_record
+                    self.change_detector.record_stale(task.link)
+                self.record_result(task.page, output_record)
+                if failure is None:
+                    self.state.mark_done(task.link)
+                else:
+                    self.state.mark_failed(task.link, str(failure))
+            finally:
+                self.link_queue.task_done()
+                
+    def page_key(self, page_number):
+        """Page numbers repeat across agencies, so pages are tracked as 'agency/page' in multi-agency mode"""
+        if self.current_agency is None:
+            return page_number
+        return f"{self.current_agency}/{page_number}"
+        
+    def enqueue_links(self, page_number, service_rows):
+        """Queue the (link, row text) rows that are neither completed nor already queued in this run"""
+        if self.current_agency is not None:
+            # Dịch vụ đã có trong queue vẫn được liên kết với cơ quan đang quét
+            for link, row_text in service_rows:
+                self.state.link_agency(link, self.current_agency)
+        new_rows = []
+        for link, row_text in service_rows:
+            if link in self.completed_urls or link in self.queued_urls:
+                continue
+            self.queued_urls.add(link)
+            new_rows.append((link, row_text))
+            
+        skipped = len(service_rows) - len(new_rows)
+        if skipped:
+            print(f"Skipping {skipped} services already completed or queued")
+            
+        self.register_page(page_number, new_rows)
+        for link, row_text in new_rows:
+            self.state.mark_pending(link, page_number)
+            # put() blocks while the queue is full, so listing never runs far ahead of the workers
+            self.link_queue.put(ServiceTask(page_number, link, row_text))
+        
+    def search_url(self, page_number):
+        """Search-endpoint url of one listing page; the template may use {page}, {page_size}
+        and any query parameter of the listing url (e.g. {pCoQuanId})"""
+        params = {key: values[0] for key, values in parse_qs(urlparse(self.listing.base_url).query).items()}
+        params.update(page=page_number, page_size=LISTING_PAGE_SIZE)
+        return self.search_url_template.format(**params)
+        
+    def fetch_listing_pages(self, pages):
+        """Fetch listing pages concurrently from the search endpoint; return {page: rows} for those that worked"""
+        from http_engine import HttpServiceExtractor, parse_listing
+        fetcher = self.http_extractor or HttpServiceExtractor(pool_size=self.max_workers)
+        
+        def fetch(page_number):
+            url = self.search_url(page_number)
+            # Trang danh sách cũng đi qua giới hạn tốc độ theo host như các trang chi tiết
+            self.scheduler.throttle(url)
+            with self.metrics.timer("listing_fetch", "search"):
+                return parse_listing(fetcher.fetch(url, referer=self.listing.base_url), url)
+        
+        results = {}
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {executor.submit(fetch, page): page for page in pages}
+                for future in concurrent.futures.as_completed(futures):
+                    try:
+                        results[futures[future]] = future.result()
+                    except Exception as e:
+                        print(f"Could not fetch listing page {futures[future]} from the search endpoint: {e}")
+        finally:
+            if fetcher is not self.http_extractor:
+                fetcher.close()
+        return results
+        
+    def collect_listing_pages(self, pages):
+        """Paginate with the main driver and extra listing drivers sharing one page queue"""
+        page_queue = queue.Queue()
+        for page in pages:
+            page_queue.put(page)
+        results = {}
+        results_lock = threading.Lock()
+        
+        def drain(listing, name):
+            while True:
                 try:
-                    service_queue.task_done()
-                except:
-                    pass
+                    page = page_queue.get_nowait()
+                except queue.Empty:
+                    return
+                if listing.current_page != page:
+                    with self.metrics.timer("navigate_to_page", name):
+                        listing.navigate_to_page(page)
+                with self.metrics.timer("get_service_links", name):
+                    rows = listing.get_service_rows()
+                self.traffic.measure(name, listing.driver, f"listing page {page}")
+                with results_lock:
+                    results[page] = rows
+        
+        def run_extra(name):
+            try:
+                listing = ListingDriver(self.listing.base_url, self.profile, self.wait_stats, self.wait_timeouts)
+            except Exception as e:
+                print(f"Could not start listing driver {name}: {e}")
+                return
+            try:
+                listing.open_listing()
+                drain(listing, name)
+            finally:
+                listing.close()
+        
+        extra_count = min(self.listing_drivers - 1, max(0, len(pages) - 1))
+        extras = [threading.Thread(target=run_extra, args=(f"listing-{i}",)) for i in range(1, extra_count + 1)]
+        for extra in extras:
+            extra.daemon = True
+            extra.start()
+        drain(self.listing, "listing")
+        for extra in extras:
+            extra.join()
+        return results
+        
+    def discover_frontier(self, start_page, end_page):
+        """Collect every listing page concurrently and return {page: rows}, each link kept on its first page only"""
+        start_time = time.time()
+        pages = list(range(start_page, end_page + 1))
+        frontier = {}
+        if self.search_url_template:
+            frontier.update(self.fetch_listing_pages(pages))
+        missing = [page for page in pages if page not in frontier]
+        if missing:
+            if self.search_url_template:
+                print(f"Collecting {len(missing)} listing pages with the browser")
+            frontier.update(self.collect_listing_pages(missing))
+        
+        seen_links = set()
+        duplicates = 0
+        for page in pages:
+            unique_rows = []
+            for link, row_text in frontier.get(page, []):
+                if link in seen_links:
+                    duplicates += 1
+                    continue
+                seen_links.add(link)
+                unique_rows.append((link, row_text))
+            frontier[page] = unique_rows
+        print(f"Discovered {len(seen_links)} services on {len(pages)} listing pages in "
+              f"{time.time() - start_time:.1f}s ({duplicates} duplicates dropped)")
+        return frontier
+        
+    def requeue_unfinished(self):
+        """Put the services left pending or in flight by the interrupted previous run back in the queue"""
+        unfinished = [(url, None) for url, page in self.state.unfinished_urls()]
+        print(f"Re-queuing {len(unfinished)} services unfinished in the previous run")
+        self.enqueue_links(RESUME_PAGE, unfinished)
+        
+    def produce_links(self, start_page, end_page, total_pages):
+        """Producer: paginate with the main driver and stream links into the bounded queue"""
+        if self.listing_drivers > 1 or self.search_url_template:
+            # Toàn bộ frontier được thu thập song song trước, sau đó mới đưa vào queue theo thứ tự trang
+            frontier = self.discover_frontier(start_page, end_page)
+            for page in range(start_page, end_page + 1):
+                self.enqueue_links(self.page_key(page), frontier[page])
+            return
+            
+        for page in range(start_page, end_page + 1):
+            print(f"Processing page {page} of {total_pages}")
+            
+            if page > 1:
+                # Điều hướng đến trang tiếp theo
+                with self.metrics.timer("navigate_to_page", "listing"):
+                    self.navigate_to_page(page)
+            
+            # Lấy danh sách các link dịch vụ cùng nội dung dòng tương ứng
+            with self.metrics.timer("get_service_links", "listing"):
+                service_rows = self.get_service_rows()
+            print(f"Found {len(service_rows)} services on page {page}")
+            self.traffic.measure("listing", self.driver, f"listing page {page}")
+            
+            self.enqueue_links(self.page_key(page), service_rows)
+            
+    def produce_agencies(self, start_page, end_page):
+        """Producer for multi-agency mode: every agency's listing feeds the same queue and worker pool"""
+        for agency in self.agencies:
+            self.current_agency = agency
+            self.listing.base_url = agency_listing_url(self.base_url, agency)
+            print(f"Collecting services of agency {agency}")
+            total_pages = self.open_listing()
+            last_page = total_pages if end_page is None else min(end_page, total_pages)
+            self.produce_links(start_page, last_page, total_pages)
+        self.current_agency = None
+        
+    def write_agency_partitions(self):
+        """Write one stream (and JSON file) per agency holding every service it lists, with its agency links"""
+        agencies_by_url = self.state.agencies_by_url()
+        sinks = {
+            agency: JsonlSink(stream_path(f"{self.output_name}_agency_{agency}", self.compression),
+                              flush_every=1000)
+            for agency in self.agencies
+        }
+        seen_urls = set()
+        try:
+            for record in iter_records(self.stream_path):
+                url = record.get("url")
+                if url in seen_urls:
+                    continue
+                seen_urls.add(url)
+                agencies = agencies_by_url.get(url, [])
+                record["agencies"] = agencies
+                for agency in agencies:
+                    if agency in sinks:
+                        sinks[agency].write(record)
+        finally:
+            for sink in sinks.values():
+                sink.close()
+        
+        for agency, sink in sinks.items():
+            print(f"Agency {agency}: {sink.count} services in {sink.path}")
+            if self.consolidate_output:
+                consolidate(sink.path, f"{self.output_name}_agency_{agency}_complete.json")
+    
+    def wait_for_tasks(self):
+        """Block until every queued service and every scheduled retry has been processed"""
+        while True:
+            self.link_queue.join()
+            if not self.retry_queue.has_pending():
+                return
+            self.retry_queue.wait_idle()
     
-    def crawl(self):
-        """Main crawling function"""
+    def crawl(self, start_page=1, end_page=None, urls=None):
+        """Main crawling function; start_page/end_page restrict the crawl to a range of listing pages
+
+        With ``urls`` (e.g. entries of a dead-letter file) only those detail pages are crawled
+        and the listing is not opened.
+        """
         try:
+            self.state = CrawlState(self.state_path, journal_mode=self.state_journal)
+            self.resumed = self.state.begin_run(self.resume)
+            # Khi tiếp tục lần chạy trước hoặc chạy lại dead-letter, ghi nối vào stream cũ thay vì ghi đè
+            self.sink = JsonlSink(self.stream_path, append=self.resumed or urls is not None,
+                                  flush_every=self.flush_every)
+            self.dead_letter = DeadLetterFile(self.dead_letter_path, append=self.resumed)
+            self.retry_queue = RetryQueue(self.link_queue.put, self.max_attempts, self.retry_delay)
+            if self.metrics_port:
+                self.metrics_exporters.append(MetricsServer(self.metrics, self.metrics_port))
+            if self.metrics_snapshot:
+                self.metrics_exporters.append(SnapshotWriter(self.metrics, self.metrics_snapshot, self.metrics_interval))
+            for exporter in self.metrics_exporters:
+                exporter.start()
+            # Output is flushed before every state commit, so "done" never gets ahead of the stream
+            self.state.before_commit = self.sink.flush
+            if self.resumed:
+                self.completed_urls = self.state.completed_urls()
+                print(f"Resuming previous crawl: {len(self.completed_urls)} services already completed")
+            if self.incremental:
+                self.change_detector = ChangeDetector(self.state, self.http_extractor, self.scheduler.throttle,
+                                                      self.popup_url_template)
+            
             # Truy cập trang và thiết lập kích thước trang
-            self.driver.get(self.base_url)
-            time.sleep(3)
-            
-            # Thiết lập kích thước trang và lấy tổng số trang
-            page_size_select = self.driver.find_element(By.CSS_SELECTOR, "#pageSize")
-            for option in page_size_select.find_elements(By.TAG_NAME, "option"):
-                if option.text == "50":
-                    option.click()
-                    time.sleep(2)
-                    break
+            # Khởi động pool driver song song trong khi trang danh sách đang tải
+            pool_starter = None
+            if self.engine == "selenium":
+                pool_starter = threading.Thread(target=self.pool.start)
+                pool_starter.daemon = True
+                pool_starter.start()
             
-            total_pages = self.get_total_pages()
-            print(f"Total records: {self.total_records}, Total pages: {total_pages}")
+            if urls is None and self.agencies is None:
+                total_pages = self.open_listing()
+                end_page = total_pages if end_page is None else min(end_page, total_pages)
             
-            # Lặp qua từng trang và xử lý
-            for page in range(1, total_pages + 1):
-                print(f"Processing page {page} of {total_pages}")
-                
-                if page > 1:
-                    # Điều hướng đến trang tiếp theo
-                    self.navigate_to_page(page)
-                
-                # Lấy danh sách các link dịch vụ
-                service_links = self.get_service_links()
-                print(f"Found {len(service_links)} services on page {page}")
-                
-                if service_links:
-                    # Xử lý các link song song với nhiều thread
-                    processed_count = self.process_service_batch(service_links, page)
-                    print(f"Processed {processed_count} services from page {page}")
-                
-                # Lưu dữ liệu đã thu thập được cho đến hiện tại
-                self.save_data("hoabinh_services_current.json")
+            # Pool phải sẵn sàng trước khi các consumer bắt đầu lấy link
+            if pool_starter is not None:
+                pool_starter.join()
+                self.pool.start()
+                consumer_count = len(self.pool.workers)
+            else:
+                consumer_count = self.max_workers
+            
+            consumers = []
+            for i in range(consumer_count):
+                consumer = threading.Thread(target=self.consume_links)
+                consumer.daemon = True
+                consumers.append(consumer)
+                consumer.start()
             
-            # Lưu kết quả cuối cùng
-            self.save_data("hoabinh_services_complete.json")
-            print(f"Crawling completed. Total services extracted: {len(self.data)}")
+            if self.resumed:
+                # Đưa lại vào queue các link đang xử lý dở hoặc còn chờ từ lần chạy trước
+                self.requeue_unfinished()
+            if urls is None and self.agencies is not None:
+                self.produce_agencies(start_page, end_page)
+            elif urls is None:
+                # Driver chính phân trang trong khi các worker trích xuất chi tiết song song
+                self.produce_links(start_page, end_page, total_pages)
+            else:
+                print(f"Replaying {len(urls)} services")
+                self.enqueue_links(REPLAY_PAGE, [(url, None) for url in urls])
+            
+            # Đợi xử lý hết các link còn trong queue (kể cả các lần thử lại) rồi dừng các consumer
+            self.wait_for_tasks()
+            for consumer in consumers:
+                self.link_queue.put(None)
+            for consumer in consumers:
+                consumer.join()
+            
+            self.state.finish_run()
+            self.sink.close()
+            if self.agencies is not None and urls is None:
+                self.write_agency_partitions()
+            print(f"Crawling completed. Total services extracted: {self.extracted_count}")
+            if self.dead_letter.count:
+                print(f"{self.dead_letter.count} services failed every attempt; "
+                      f"replay them with: python crawl.py --replay {self.dead_letter_path}")
+            if self.change_detector is not None:
+                self.change_detector.print_report()
+            
+            # Tạo file JSON tổng hợp từ stream khi cần
+            if self.consolidate_output:
+                self.save_data(f"{self.output_name}_complete.json")
+            if self.export_format:
+                with self.metrics.timer("export_tables"):
+                    export_tables(self.stream_path, export_path(self.output_name, self.export_format),
+                                  self.export_format)
+            return True
             
         except Exception as e:
             print(f"Error during crawling: {e}")
+            return False
         finally:
+            if self.change_detector is not None:
+                self.change_detector.close()
+            if self.state is not None:
+                self.state.close()
+            if self.sink is not None:
+                self.sink.close()
+            if self.retry_queue is not None:
+                self.retry_queue.close()
+                self.retry_queue.print_summary()
+            if self.dead_letter is not None:
+                self.dead_letter.close()
             self.driver.quit()
+            if self.http_extractor is not None:
+                self.http_extractor.close()
+            self.pool.close()
+            self.pool.print_stats()
+            self.wait_stats.print_summary()
+            self.scheduler.print_summary()
+            self.traffic.print_summary()
+            self.metrics.print_summary()
+            if self.html_cache is not None:
+                self.html_cache.print_summary()
+                self.html_cache.close()
+            for exporter in self.metrics_exporters:
+                exporter.close()
             
-    def save_data(self, filename, data_to_save=None):
-        """Save the crawled data to a JSON file"""
-        with self.data_lock:
-            data_to_write = data_to_save if data_to_save is not None else self.data
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(data_to_write, f, ensure_ascii=False, indent=4)
-            print(f"Data saved to {filename}")
+    def save_data(self, filename):
+        """Build a JSON array file from the output stream"""
+        with self.metrics.timer("save_data"):
+            if self.sink is not None:
+                self.sink.flush()
+            count = consolidate(self.stream_path, filename)
+        print(f"Data saved to {filename} ({count} services)")
         
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl public services from dichvucong.gov.vn")
     # Sử dụng 4 luồng song song, có thể thay đổi tùy theo số lõi CPU và băng thông mạng
-    crawler = HoaBinhServiceCrawler(max_workers=4)
-    crawler.crawl()
\ No newline at end of file
+    parser.add_argument("--workers", type=int, default=4, help="number of parallel workers")
+    parser.add_argument("--engine", choices=["selenium", "http"], default="selenium",
+                        help="detail page extraction engine")
+    parser.add_argument("--no-selenium-fallback", action="store_true",
+                        help="with --engine http, do not retry pages without popup data in Chrome")
+    parser.add_argument("--popup-url-template",
+                        help="url filling #popupChitietTTHC, e.g. 'https://host/popup?ma_thu_tuc={ma_thu_tuc}'")
+    parser.add_argument("--base-url", help="listing page url (e.g. a local stand-in server)")
+    parser.add_argument("--extraction-mode", choices=["elements", "script"], default="elements",
+                        help="Selenium extraction: one WebDriver call per field, or one script per service")
+    parser.add_argument("--wait-timeout", action="append", default=[], metavar="CONDITION=SECONDS",
+                        help="override the timeout of one wait condition, e.g. page_change=20 (repeatable)")
+    parser.add_argument("--output", default="hoabinh_services", help="base name of the output files")
+    parser.add_argument("--compression", choices=["gzip", "zstd"], help="compress the JSON Lines stream")
+    parser.add_argument("--no-consolidate", action="store_true",
+                        help="only write the JSON Lines stream, not <output>_complete.json")
+    parser.add_argument("--state", default="hoabinh_crawl_state.db", help="SQLite file recording per-URL crawl state")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="start from scratch even if the previous crawl did not finish")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only re-extract services that are new or changed since the previous run")
+    parser.add_argument("--min-workers", type=int, default=1,
+                        help="lower bound for the adaptive number of active workers (--workers is the upper bound)")
+    parser.add_argument("--rate-limit", type=float, help="maximum requests per second per host (detail pages, listing fetches and change checks)")
+    parser.add_argument("--target-latency", type=float, default=10.0,
+                        help="average seconds per service above which the scheduler backs off")
+    parser.add_argument("--max-attempts", type=int, default=3,
+                        help="attempts per service before it is written to <output>_dead_letter.jsonl")
+    parser.add_argument("--retry-delay", type=float, default=5.0,
+                        help="backoff before the first retry, doubled for every further attempt")
+    parser.add_argument("--browser-profile", choices=["full", "lean"], default="full",
+                        help="lean: eager page loads, no extensions/GPU/background networking, blocked resources")
+    parser.add_argument("--block-resources", default="image,font,stylesheet,media",
+                        help="comma-separated resource types the lean profile blocks")
+    parser.add_argument("--block-url", action="append", default=[], metavar="PATTERN",
+                        help="extra URL pattern to block, e.g. '*chatbot*' (repeatable)")
+    parser.add_argument("--max-browser-memory", type=int, default=1500, metavar="MB",
+                        help="recycle a worker's Chrome when its process tree uses more memory (0: no limit)")
+    parser.add_argument("--max-consecutive-failures", type=int, default=3,
+                        help="recycle a worker's Chrome after this many failures in a row")
+    parser.add_argument("--max-services-per-driver", type=int, default=500,
+                        help="recycle a worker's Chrome after it served this many services (0: no limit)")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port during the crawl")
+    parser.add_argument("--metrics-snapshot", metavar="PATH", help="periodically write a JSON metrics snapshot")
+    parser.add_argument("--metrics-interval", type=float, default=30.0, help="seconds between JSON snapshots")
+    parser.add_argument("--listing-drivers", type=int, default=1,
+                        help="browsers collecting listing pages in parallel before extraction starts")
+    parser.add_argument("--search-url-template",
+                        help="fetch listing pages directly, e.g. 'https://host/search?pCoQuanId={pCoQuanId}"
+                             "&page={page}&pageSize={page_size}'")
+    parser.add_argument("--agencies", help="comma-separated pCoQuanId values crawled with one shared worker pool")
+    parser.add_argument("--html-cache", metavar="DIR",
+                        help="keep the raw detail/popup HTML of every service for 'python html_cache.py reparse'")
+    parser.add_argument("--export-tables", choices=["sqlite", "parquet"],
+                        help="also write normalized services/meta/details/legal-document tables")
+    parser.add_argument("--replay", metavar="DEAD_LETTER_FILE",
+                        help="only crawl the services listed in a dead-letter file")
+    args = parser.parse_args()
+    
+    wait_timeouts = {}
+    for override in args.wait_timeout:
+        condition, _, seconds = override.partition("=")
+        wait_timeouts[condition.strip()] = float(seconds)
+    
+    crawler = HoaBinhServiceCrawler(
+        max_workers=args.workers,
+        engine=args.engine,
+        selenium_fallback=not args.no_selenium_fallback,
+        popup_url_template=args.popup_url_template,
+        base_url=args.base_url,
+        extraction_mode=args.extraction_mode,
+        wait_timeouts=wait_timeouts,
+        output_name=args.output,
+        compression=args.compression,
+        consolidate_output=not args.no_consolidate,
+        state_path=args.state,
+        resume=not args.no_resume,
+        incremental=args.incremental,
+        min_workers=args.min_workers,
+        rate_limit=args.rate_limit,
+        target_latency=args.target_latency,
+        max_attempts=args.max_attempts,
+        retry_delay=args.retry_delay,
+        browser_profile=BrowserProfile(
+            args.browser_profile,
+            block_resources=[name.strip() for name in args.block_resources.split(",") if name.strip()],
+            block_urls=args.block_url
+        ),
+        health_policy=HealthPolicy(
+            max_rss_mb=args.max_browser_memory,
+            max_consecutive_failures=args.max_consecutive_failures,
+            max_services=args.max_services_per_driver
+        ),
+        metrics_port=args.metrics_port,
+        metrics_snapshot=args.metrics_snapshot,
+        metrics_interval=args.metrics_interval,
+        listing_drivers=args.listing_drivers,
+        search_url_template=args.search_url_template,
+        agencies=[agency.strip() for agency in args.agencies.split(",") if agency.strip()] if args.agencies else None,
+        html_cache=args.html_cache,
+        export_format=args.export_tables
+    )
+    if args.replay:
+        # Đọc file trước khi crawl, vì lần chạy lại ghi file dead-letter mới
+        crawler.crawl(urls=[entry["url"] for entry in DeadLetterFile.load(args.replay)])
+    else:
+        crawler.crawl()
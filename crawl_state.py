@@ -0,0 +1,209 @@
+"""Durable per-URL crawl state stored in SQLite.
+
+Each service URL is recorded with its status (pending / in-flight / done /
+failed), attempt count and timestamps so an interrupted crawl can resume
+where it stopped. Workers only enqueue updates; a single writer thread
+(``batch_writer.BatchWriter``) commits them in batches so the database
+never becomes a bottleneck.
+
+The ``agency_links`` table records every agency whose listing showed a URL
+during the run, so a service extracted once can be linked to all of them.
+
+The ``fingerprints`` table survives across runs and keeps, per URL, the
+listing-row hash, decision number, content hash and last extracted record
+used by incremental recrawls.
+"""
+import json
+import sqlite3
+import threading
+import time
+
+from batch_writer import BatchWriter
+
+PENDING = "pending"
+IN_FLIGHT = "in-flight"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    page INTEGER,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL,
+    updated_at REAL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS urls_status ON urls(status);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    url TEXT PRIMARY KEY,
+    row_hash TEXT,
+    decision_number TEXT,
+    content_hash TEXT,
+    record TEXT,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS agency_links (
+    url TEXT NOT NULL,
+    agency TEXT NOT NULL,
+    PRIMARY KEY (url, agency)
+);
+CREATE TABLE IF NOT EXISTS run (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_SQL = {
+    "pending": (
+        "INSERT INTO urls (url, page, status, created_at, updated_at) VALUES (?, ?, 'pending', ?, ?) "
+        "ON CONFLICT(url) DO UPDATE SET status = 'pending', page = COALESCE(excluded.page, urls.page), "
+        "updated_at = excluded.updated_at"
+    ),
+    "in-flight": (
+        "UPDATE urls SET status = 'in-flight', attempts = attempts + 1, started_at = ?, updated_at = ? "
+        "WHERE url = ?"
+    ),
+    "done": "UPDATE urls SET status = 'done', error = NULL, finished_at = ?, updated_at = ? WHERE url = ?",
+    "failed": "UPDATE urls SET status = 'failed', error = ?, finished_at = ?, updated_at = ? WHERE url = ?",
+    "agency": "INSERT OR IGNORE INTO agency_links (url, agency) VALUES (?, ?)",
+    "fingerprint": (
+        "INSERT OR REPLACE INTO fingerprints (url, row_hash, decision_number, content_hash, record, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)"
+    ),
+}
+
+
+class CrawlState:
+    """SQLite-backed record of every service URL seen by the crawler"""
+    def __init__(self, path="hoabinh_crawl_state.db", batch_size=200, flush_interval=1.0, journal_mode="WAL"):
+        self.path = path
+        # Called by the writer thread right before each commit (e.g. to flush the output stream first)
+        self.before_commit = None
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        # WAL needs shared memory between readers and writers on one host; state kept on a network
+        # filesystem (sharded crawls over NFS) must use a rollback journal such as "DELETE" instead
+        self.connection.execute(f"PRAGMA journal_mode={journal_mode}")
+        self.connection.executescript(SCHEMA)
+        self.connection.commit()
+        self.db_lock = threading.Lock()
+
+        self.writer = BatchWriter(self._commit, "crawl-state-writer", batch_size, flush_interval)
+
+    # Run lifecycle
+
+    def begin_run(self, resume=True):
+        """Start a run; return True when an unfinished previous run is being resumed"""
+        with self.db_lock:
+            row = self.connection.execute("SELECT value FROM run WHERE key = 'status'").fetchone()
+            resumed = resume and row is not None and row[0] == "running"
+            if not resumed:
+                self.connection.execute("DELETE FROM urls")
+                self.connection.execute("DELETE FROM agency_links")
+            self.connection.execute("INSERT OR REPLACE INTO run (key, value) VALUES ('status', 'running')")
+            self.connection.execute("INSERT OR REPLACE INTO run (key, value) VALUES ('started_at', ?)", (str(time.time()),))
+            self.connection.commit()
+        return resumed
+
+    def finish_run(self):
+        """Mark the run complete so the next crawl starts from scratch"""
+        self.flush()
+        with self.db_lock:
+            self.connection.execute("INSERT OR REPLACE INTO run (key, value) VALUES ('status', 'finished')")
+            self.connection.commit()
+
+    # Reads
+
+    def completed_urls(self):
+        with self.db_lock:
+            return {row[0] for row in self.connection.execute("SELECT url FROM urls WHERE status = ?", (DONE,))}
+
+    def unfinished_urls(self):
+        """(url, page) of every URL that was pending or in flight when the previous run stopped"""
+        with self.db_lock:
+            return self.connection.execute(
+                "SELECT url, page FROM urls WHERE status IN (?, ?) ORDER BY page, created_at",
+                (IN_FLIGHT, PENDING)
+            ).fetchall()
+
+    def fingerprint(self, url):
+        """Fingerprint and last record stored for a URL by a previous run, or None"""
+        with self.db_lock:
+            row = self.connection.execute(
+                "SELECT row_hash, decision_number, content_hash, record FROM fingerprints WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "row_hash": row[0],
+            "decision_number": row[1],
+            "content_hash": row[2],
+            "record": json.loads(row[3]) if row[3] else None,
+        }
+
+    def agencies_by_url(self):
+        """url -> sorted list of the agencies that listed it in this run"""
+        agencies = {}
+        with self.db_lock:
+            for url, agency in self.connection.execute("SELECT url, agency FROM agency_links ORDER BY url, agency"):
+                agencies.setdefault(url, []).append(agency)
+        return agencies
+
+    def fingerprinted_urls(self):
+        with self.db_lock:
+            return {row[0] for row in self.connection.execute("SELECT url FROM fingerprints")}
+
+    def counts(self):
+        with self.db_lock:
+            return dict(self.connection.execute("SELECT status, COUNT(*) FROM urls GROUP BY status").fetchall())
+
+    # Batched writes
+
+    def mark_pending(self, url, page):
+        """Queue (or re-queue, e.g. for a retry) a URL; an existing row goes back to pending"""
+        now = time.time()
+        self.writer.put(("pending", (url, page, now, now)))
+
+    def mark_in_flight(self, url):
+        now = time.time()
+        self.writer.put(("in-flight", (now, now, url)))
+
+    def mark_done(self, url):
+        now = time.time()
+        self.writer.put(("done", (now, now, url)))
+
+    def mark_failed(self, url, error):
+        now = time.time()
+        self.writer.put(("failed", (str(error), now, now, url)))
+
+    def link_agency(self, url, agency):
+        self.writer.put(("agency", (url, str(agency))))
+
+    def save_fingerprint(self, url, row_hash, decision_number, content_hash, record):
+        record_json = json.dumps(record, ensure_ascii=False)
+        self.writer.put(("fingerprint", (url, row_hash, decision_number, content_hash, record_json, time.time())))
+
+    def flush(self):
+        """Block until every queued update has been committed"""
+        self.writer.flush()
+
+    def close(self):
+        self.writer.close()
+        with self.db_lock:
+            self.connection.close()
+
+    def _commit(self, batch):
+        try:
+            if self.before_commit is not None:
+                self.before_commit()
+            with self.db_lock:
+                with self.connection:
+                    # Apply in arrival order so in-flight -> done sequences stay correct
+                    for kind, params in batch:
+                        self.connection.execute(_SQL[kind], params)
+        except Exception as e:
+            print(f"Could not write crawl state: {e}")
@@ -0,0 +1,323 @@
+"""Local stand-in of the dichvucong.gov.vn pages the crawler depends on.
+
+Serves a listing page (``#pageSize``, ``#totalRecord``, ``.pagination
+.active``, a ``doSearch(n)`` AJAX pager and ``ul.list-document li a``) and
+detail pages (``h1.main-title.-none``, the ``#popupChitietTTHC`` modal filled
+by AJAX and the ``list-expand`` sections), all generated deterministically.
+Every dynamic response can be delayed (``latency`` + random ``jitter``) and
+fail with HTTP 500 at a configurable rate, so crawler performance and
+resilience can be measured without touching the live portal.
+
+Usage:
+    python fixture_server.py --port 8000 --services 500 --latency 0.2 --error-rate 0.02
+    python crawl.py --base-url "http://127.0.0.1:8000/p/home/dvc-dich-vu-cong-truc-tuyen-ds.html?pCoQuanId=387628"
+"""
+import argparse
+import html
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+LISTING_PATH = "/p/home/dvc-dich-vu-cong-truc-tuyen-ds.html"
+DETAIL_PATH = "/p/home/dvc-chi-tiet-thu-tuc-hanh-chinh.html"
+SEARCH_PATH = "/search"
+POPUP_PATH = "/popup"
+DEFAULT_AGENCY = 387628
+
+FIELDS = ["Đất đai", "Xây dựng", "Tư pháp", "Giáo dục", "Y tế", "Giao thông", "Lao động", "Thuế"]
+LEVELS = ["Cấp Tỉnh", "Cấp Huyện", "Cấp Xã"]
+KINDS = ["TTHC được luật giao quy định chi tiết", "TTHC không được luật giao"]
+WORDS = ["hồ sơ", "giấy tờ", "đề nghị", "cấp", "chứng nhận", "đăng ký", "thẩm định", "phê duyệt",
+         "bản sao", "tờ khai", "quyết định", "cơ quan", "người nộp", "kết quả", "trả lời", "bổ sung"]
+
+LISTING_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Dịch vụ công trực tuyến</title>
+<script>
+// Stand-in for the jQuery AJAX counter the crawler's network-idle wait reads
+window.jQuery = {{active: 0}};
+function doSearch(page) {{
+    var size = document.getElementById('pageSize').value;
+    var xhr = new XMLHttpRequest();
+    jQuery.active++;
+    xhr.open('GET', '{search_path}?pCoQuanId={agency}&page=' + page + '&pageSize=' + size);
+    xhr.onloadend = function () {{
+        if (xhr.status === 200) {{
+            document.getElementById('result').innerHTML = xhr.responseText;
+        }}
+        jQuery.active--;
+    }};
+    xhr.send();
+}}
+</script></head>
+<body>
+<h1>Danh sách dịch vụ công</h1>
+<select id="pageSize" onchange="doSearch(1)">
+<option value="10" selected>10</option><option value="20">20</option><option value="50">50</option>
+</select>
+<div id="result">{result}</div>
+</body></html>"""
+
+DETAIL_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>.modal {{ display: none; }} .modal.in {{ display: block; }}</style>
+<script>
+window.jQuery = {{active: 0}};
+function openPopup(link) {{
+    var popup = document.getElementById('popupChitietTTHC');
+    popup.className = 'modal in';
+    var xhr = new XMLHttpRequest();
+    jQuery.active++;
+    xhr.open('GET', link.getAttribute('data-url'));
+    xhr.onloadend = function () {{
+        if (xhr.status === 200) {{
+            document.getElementById('popupBody').innerHTML = xhr.responseText;
+        }}
+        jQuery.active--;
+    }};
+    xhr.send();
+    return false;
+}}
+function closePopup() {{
+    document.getElementById('popupChitietTTHC').className = 'modal';
+}}
+</script></head>
+<body>
+<h1 class="main-title -none">{title}</h1>
+<a class="url" data-toggle="modal" href="#popupChitietTTHC" data-url="{popup_url}" onclick="return openPopup(this)">Xem chi tiết</a>
+<div class="box"><h2>Trình tự thực hiện</h2><div>{steps}</div></div>
+<div class="box"><h2>Cách thức thực hiện</h2><table><tr><th>Hình thức nộp</th><th>Thời hạn giải quyết</th></tr>{methods}</table></div>
+<div class="box"><h2>Thành phần hồ sơ</h2><div class="list-expand">{documents}</div></div>
+<div class="box"><h2>Thông tin khác</h2><div class="list-expand">
+<div class="item"><div class="title">Cơ quan thực hiện</div><div class="content"><div class="article">{agency_name}</div></div></div>
+</div></div>
+<div class="box"><h2>Yêu cầu, điều kiện thực hiện</h2><div class="article">{requirements}</div></div>
+<div class="modal" id="popupChitietTTHC">
+<div class="close" onclick="closePopup()"><span class="-ap icon icon-close">×</span></div>
+<div id="popupBody"></div>
+</div>
+</body></html>"""
+
+
+class FixtureSite:
+    """Deterministic catalogue of services, each listed under one or more agencies"""
+    def __init__(self, services=200, agencies=(DEFAULT_AGENCY,), shared_every=5):
+        self.count = services
+        self.agencies = list(agencies)
+        # Every shared_every-th service is listed by every agency, like procedures shared between departments
+        self.shared_every = shared_every
+
+    @staticmethod
+    def code(service_id):
+        return f"1.{service_id:06d}"
+
+    @staticmethod
+    def service_id(code):
+        return int(code.split(".", 1)[1])
+
+    def agencies_of(self, service_id):
+        if len(self.agencies) == 1 or (self.shared_every and service_id % self.shared_every == 0):
+            return list(self.agencies)
+        return [self.agencies[service_id % len(self.agencies)]]
+
+    def listed(self, agency):
+        return [service_id for service_id in range(1, self.count + 1) if agency in self.agencies_of(service_id)]
+
+    def title(self, service_id):
+        rng = random.Random(service_id)
+        return (f"Thủ tục {rng.choice(WORDS)} {rng.choice(WORDS)} "
+                f"lĩnh vực {FIELDS[service_id % len(FIELDS)]} số {service_id}")
+
+    def text(self, service_id, salt, words):
+        rng = random.Random(f"{service_id}-{salt}")
+        return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+    def search_fragment(self, agency, page, page_size):
+        listed = self.listed(agency)
+        total_pages = max(1, (len(listed) + page_size - 1) // page_size)
+        page = min(max(1, page), total_pages)
+        rows = []
+        for service_id in listed[(page - 1) * page_size:page * page_size]:
+            url = f"{DETAIL_PATH}?ma_thu_tuc={self.code(service_id)}"
+            rows.append(f'<li><a href="{url}">{html.escape(self.title(service_id))}</a> '
+                        f'<span class="field">{FIELDS[service_id % len(FIELDS)]}</span></li>')
+        pages = "".join(
+            f'<li class="active">{number}</li>' if number == page
+            else f'<li><a href="javascript:doSearch({number})">{number}</a></li>'
+            for number in range(1, total_pages + 1)
+        )
+        return (f'<p>Tổng số: <span id="totalRecord">{len(listed)}</span></p>'
+                f'<ul class="list-document">{"".join(rows)}</ul>'
+                f'<ul class="pagination">{pages}</ul>')
+
+    def listing_page(self, agency):
+        return LISTING_TEMPLATE.format(search_path=SEARCH_PATH, agency=agency,
+                                       result=self.search_fragment(agency, 1, 10))
+
+    def detail_page(self, service_id):
+        code = self.code(service_id)
+        steps = "".join(f"<p>Bước {step}: {self.text(service_id, f'step{step}', 12)}</p>" for step in range(1, 4))
+        methods = "".join(
+            f"<tr><td>{method}</td><td>{(service_id % 15) + 5} ngày làm việc</td></tr>"
+            for method in ("Trực tiếp", "Trực tuyến", "Dịch vụ bưu chính")
+        )
+        documents = "".join(
+            f'<div class="item"><div class="title">{title}</div>'
+            f'<div class="content">{self.text(service_id, title, 15)}</div></div>'
+            for title in ("Giấy tờ phải nộp", "Giấy tờ phải xuất trình", "Lưu ý")
+        )
+        return DETAIL_TEMPLATE.format(
+            title=html.escape(self.title(service_id)),
+            popup_url=f"{POPUP_PATH}?ma_thu_tuc={code}",
+            steps=steps,
+            methods=methods,
+            documents=documents,
+            agency_name=", ".join(f"Sở {FIELDS[agency % len(FIELDS)]} ({agency})" for agency in self.agencies_of(service_id)),
+            requirements=self.text(service_id, "requirements", 20),
+        )
+
+    def popup_fragment(self, service_id):
+        rng = random.Random(f"{service_id}-popup")
+        agencies = ", ".join(f"Sở {FIELDS[agency % len(FIELDS)]} ({agency})" for agency in self.agencies_of(service_id))
+        rows = [
+            ("Mã thủ tục", self.code(service_id)),
+            ("Số quyết định", f"{rng.randint(100, 2999)}/QĐ-UBND"),
+            ("Tên thủ tục", html.escape(self.title(service_id))),
+            ("Cấp thực hiện", LEVELS[service_id % len(LEVELS)]),
+            ("Loại thủ tục", KINDS[service_id % len(KINDS)]),
+            ("Lĩnh vực", FIELDS[service_id % len(FIELDS)]),
+            ("Đối tượng thực hiện", "Công dân Việt Nam, Doanh nghiệp"),
+            ("Cơ quan thực hiện", agencies),
+            ("Cơ quan có thẩm quyền", "Ủy ban nhân dân tỉnh Hòa Bình"),
+            ("Kết quả thực hiện", f"Giấy chứng nhận {rng.choice(WORDS)}"),
+        ]
+        body = "".join(f'<div class="info-row"><div class="key">{key}</div><div class="value">{value}</div></div>'
+                       for key, value in rows)
+        documents = "".join(
+            f"<tr><td>{number}/{2015 + number % 9}/NĐ-CP</td><td>{self.text(number, 'law', 8)}</td>"
+            f"<td>01/0{1 + number % 9}/{2015 + number % 9}</td><td>Chính phủ</td></tr>"
+            # A small shared pool of legal documents, so many services cite the same ones
+            for number in sorted({rng.randint(1, 40) for _ in range(rng.randint(1, 4))})
+        )
+        body += ('<div class="info-row"><div class="key">Căn cứ pháp lý</div><div class="value">'
+                 '<table><tr><th>Số ký hiệu</th><th>Trích yếu</th><th>Ngày ban hành</th><th>Cơ quan ban hành</th></tr>'
+                 f"{documents}</table></div></div>")
+        return f'<div class="modal-body">{body}</div>'
+
+
+class FixtureServer:
+    """Threaded HTTP server for a FixtureSite with injected latency and errors"""
+    def __init__(self, site=None, host="127.0.0.1", port=0, latency=0.0, jitter=0.0,
+                 error_rate=0.0, popup_error_rate=0.0, seed=None):
+        self.site = site or FixtureSite()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.popup_error_rate = popup_error_rate
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                server.handle(handler)
+
+            def log_message(handler, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fixture-server")
+        self.thread.daemon = True
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def listing_url(self, agency=DEFAULT_AGENCY):
+        return f"{self.url}{LISTING_PATH}?pCoQuanId={agency}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _roll(self):
+        with self.random_lock:
+            return self.random.random(), self.random.random()
+
+    def handle(self, handler):
+        parsed = urlparse(handler.path)
+        query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        delay_roll, error_roll = self._roll()
+        with self.random_lock:
+            self.requests += 1
+
+        try:
+            if parsed.path == LISTING_PATH:
+                status, body = 200, self.site.listing_page(int(query.get("pCoQuanId", DEFAULT_AGENCY)))
+                error_rate = 0.0
+            elif parsed.path == SEARCH_PATH:
+                body = self.site.search_fragment(int(query.get("pCoQuanId", DEFAULT_AGENCY)),
+                                                 int(query.get("page", 1)), int(query.get("pageSize", 10)))
+                status, error_rate = 200, self.error_rate
+            elif parsed.path in (DETAIL_PATH, POPUP_PATH):
+                service_id = self.site.service_id(query["ma_thu_tuc"])
+                if not 1 <= service_id <= self.site.count:
+                    raise KeyError(service_id)
+                if parsed.path == DETAIL_PATH:
+                    status, body, error_rate = 200, self.site.detail_page(service_id), self.error_rate
+                else:
+                    status, body, error_rate = 200, self.site.popup_fragment(service_id), self.popup_error_rate
+            else:
+                status, body, error_rate = 404, "<h1>Not found</h1>", 0.0
+        except (KeyError, ValueError, IndexError):
+            status, body, error_rate = 404, "<h1>Not found</h1>", 0.0
+
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self.jitter * delay_roll)
+        if status == 200 and error_roll < error_rate:
+            status, body = 500, "<h1>Injected error</h1>"
+            with self.random_lock:
+                self.errors += 1
+
+        data = body.encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "text/html; charset=utf-8")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local stand-in of the dichvucong portal")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--services", type=int, default=200, help="number of services in the catalogue")
+    parser.add_argument("--agencies", default=str(DEFAULT_AGENCY), help="comma-separated pCoQuanId values")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay of up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of detail/search responses failing with 500")
+    parser.add_argument("--popup-error-rate", type=float, default=0.0, help="share of popup responses failing with 500")
+    parser.add_argument("--seed", type=int, help="seed for latency and error injection")
+    args = parser.parse_args()
+
+    site = FixtureSite(args.services, [int(agency) for agency in args.agencies.split(",")])
+    fixture = FixtureServer(site, args.host, args.port, args.latency, args.jitter,
+                            args.error_rate, args.popup_error_rate, args.seed)
+    print(f"Serving {args.services} services; listing pages:")
+    for agency in site.agencies:
+        print(f"  {fixture.listing_url(agency)}")
+    try:
+        fixture.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fixture.httpd.server_close()
@@ -0,0 +1,229 @@
+"""Content-addressed cache of the raw HTML behind every extracted service.
+
+With ``--html-cache DIR`` the crawler keeps, per service URL, the rendered
+detail page and the popup (#popupChitietTTHC) HTML it extracted from. Each
+snapshot is stored once as a gzip blob named by the SHA-256 of its content
+(``objects/ab/abcd....html.gz``), so a page that did not change between
+crawls, or a popup shared by several pages, costs no extra disk. A small
+SQLite index maps each URL to the hashes of its latest snapshot; workers
+only queue index updates and a single writer thread
+(``batch_writer.BatchWriter``, shared with ``crawl_state.CrawlState``)
+commits them in batches.
+
+``reparse`` rebuilds the whole dataset from the cache with the HTTP engine's
+lxml parser, without a browser or network, so a fixed XPath only needs a
+re-parse instead of a re-crawl.
+
+Usage:
+    python crawl.py --html-cache html_cache
+    python html_cache.py reparse html_cache --output hoabinh_services --jobs 4
+    python html_cache.py stats html_cache
+"""
+import argparse
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from batch_writer import BatchWriter
+from output_sink import JsonlSink, stream_path, consolidate
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    url TEXT PRIMARY KEY,
+    page_sha TEXT NOT NULL,
+    popup_sha TEXT,
+    captured_at REAL
+);
+"""
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def blob_path(root, sha):
+    return os.path.join(root, "objects", sha[:2], f"{sha}.html.gz")
+
+
+def read_blob(root, sha):
+    if sha is None:
+        return None
+    with gzip.open(blob_path(root, sha), "rt", encoding="utf-8") as f:
+        return f.read()
+
+
+class HtmlCache:
+    """Thread-safe store of (detail HTML, popup HTML) snapshots keyed by URL"""
+    def __init__(self, root, compress_level=6, batch_size=200, flush_interval=1.0):
+        self.root = root
+        self.compress_level = compress_level
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(root, "index.db"), check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        self.connection.commit()
+        self.db_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.stats = {"snapshots": 0, "blobs_written": 0, "blobs_reused": 0, "raw_bytes": 0, "stored_bytes": 0}
+        self.writer = BatchWriter(self._commit, "html-cache-writer", batch_size, flush_interval)
+
+    def _write_blob(self, text):
+        """Store text under its hash unless an identical blob already exists; return the hash"""
+        sha = content_hash(text)
+        path = blob_path(self.root, sha)
+        if os.path.exists(path):
+            with self.lock:
+                self.stats["blobs_reused"] += 1
+            return sha
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written aside and renamed: two workers storing the same blob simply replace each other
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(temporary_path, "wt", encoding="utf-8", compresslevel=self.compress_level) as f:
+            f.write(text)
+        stored = os.path.getsize(temporary_path)
+        os.replace(temporary_path, path)
+        with self.lock:
+            self.stats["blobs_written"] += 1
+            self.stats["raw_bytes"] += len(text.encode("utf-8"))
+            self.stats["stored_bytes"] += stored
+        return sha
+
+    def store(self, url, page_html, popup_html=None):
+        """Record the latest snapshot of a service page (and its popup fragment)"""
+        page_sha = self._write_blob(page_html)
+        popup_sha = self._write_blob(popup_html) if popup_html else None
+        # The blobs are on disk before their index row is queued, so a committed row never points at nothing
+        self.writer.put((url, page_sha, popup_sha, time.time()))
+        with self.lock:
+            self.stats["snapshots"] += 1
+
+    def flush(self):
+        """Block until every queued index update has been committed"""
+        self.writer.flush()
+
+    def _commit(self, batch):
+        try:
+            with self.db_lock:
+                with self.connection:
+                    self.connection.executemany(
+                        "INSERT OR REPLACE INTO snapshots (url, page_sha, popup_sha, captured_at) VALUES (?, ?, ?, ?)",
+                        batch
+                    )
+        except Exception as e:
+            print(f"Could not write HTML cache index: {e}")
+
+    def entries(self):
+        """(url, page_sha, popup_sha) of every cached service, in capture order"""
+        self.flush()
+        with self.db_lock:
+            return self.connection.execute(
+                "SELECT url, page_sha, popup_sha FROM snapshots ORDER BY captured_at, url"
+            ).fetchall()
+
+    def load(self, url):
+        """(page_html, popup_html) of the latest snapshot of a URL, or None if it was never cached"""
+        self.flush()
+        with self.db_lock:
+            row = self.connection.execute(
+                "SELECT page_sha, popup_sha FROM snapshots WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return read_blob(self.root, row[0]), read_blob(self.root, row[1])
+
+    def disk_usage(self):
+        """(number of blobs, bytes on disk) of the whole object store"""
+        blobs = size = 0
+        for directory, _, files in os.walk(os.path.join(self.root, "objects")):
+            for name in files:
+                if name.endswith(".html.gz"):
+                    blobs += 1
+                    size += os.path.getsize(os.path.join(directory, name))
+        return blobs, size
+
+    def print_summary(self):
+        with self.lock:
+            stats = dict(self.stats)
+        if not stats["snapshots"]:
+            return
+        ratio = stats["stored_bytes"] / stats["raw_bytes"] if stats["raw_bytes"] else 0.0
+        print(f"HTML cache {self.root}: {stats['snapshots']} snapshots, {stats['blobs_written']} new blobs "
+              f"({stats['raw_bytes'] / 1024 / 1024:.1f} MB -> {stats['stored_bytes'] / 1024 / 1024:.1f} MB, "
+              f"{ratio:.0%}), {stats['blobs_reused']} unchanged blobs reused")
+
+    def close(self):
+        self.writer.close()
+        with self.db_lock:
+            self.connection.close()
+
+
+def _parse_entry(task):
+    """Parse one cached service; runs in a worker process when reparse() uses several jobs"""
+    root, url, page_sha, popup_sha = task
+    from http_engine import parse_service_page
+    try:
+        return parse_service_page(read_blob(root, page_sha), url, read_blob(root, popup_sha))
+    except Exception as e:
+        print(f"Re-parse: error parsing cached {url}: {e}")
+        return None
+
+
+def reparse(root, output_name, compression=None, jobs=1, consolidate_output=True):
+    """Rebuild the dataset from cached HTML only; return (services written, services that failed to parse)"""
+    cache = HtmlCache(root)
+    entries = cache.entries()
+    cache.close()
+    print(f"Re-parsing {len(entries)} cached services from {root}")
+
+    start = time.time()
+    sink = JsonlSink(stream_path(output_name, compression), flush_every=1000)
+    tasks = [(root, url, page_sha, popup_sha) for url, page_sha, popup_sha in entries]
+    executor = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    failed = []
+    try:
+        # Records come back in capture order whichever process parsed them
+        records = executor.map(_parse_entry, tasks, chunksize=32) if executor else map(_parse_entry, tasks)
+        for task, record in zip(tasks, records):
+            if record is None:
+                failed.append(task[1])
+            else:
+                sink.write(record)
+    finally:
+        sink.close()
+        if executor is not None:
+            executor.shutdown()
+
+    elapsed = time.time() - start
+    print(f"Re-parsed {sink.count} services into {sink.path} in {elapsed:.1f}s "
+          f"({sink.count / elapsed if elapsed > 0 else 0.0:.0f} services/s)")
+    for url in failed:
+        print(f"  No service title in cached page: {url}")
+    if consolidate_output:
+        consolidate(sink.path, f"{output_name}_complete.json")
+    return sink.count, len(failed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Work with the raw HTML cache written by crawl.py --html-cache")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    reparse_parser = subparsers.add_parser("reparse", help="rebuild the dataset from cached HTML, offline")
+    reparse_parser.add_argument("cache")
+    reparse_parser.add_argument("--output", default="hoabinh_services_reparsed", help="output base name")
+    reparse_parser.add_argument("--compression", choices=["gzip", "zstd"], default=None)
+    reparse_parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="parser processes")
+    reparse_parser.add_argument("--no-consolidate", action="store_true", help="only write the JSON Lines stream")
+    stats_parser = subparsers.add_parser("stats", help="show how many snapshots and blobs the cache holds")
+    stats_parser.add_argument("cache")
+    args = parser.parse_args()
+
+    if args.command == "reparse":
+        reparse(args.cache, args.output, args.compression, args.jobs, not args.no_consolidate)
+    elif args.command == "stats":
+        cache = HtmlCache(args.cache)
+        blobs, size = cache.disk_usage()
+        print(f"{len(cache.entries())} services, {blobs} blobs, {size / 1024 / 1024:.1f} MB on disk")
+        cache.close()
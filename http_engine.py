@@ -0,0 +1,257 @@
+"""HTTP-only extraction engine for service detail pages.
+
+Fetches the detail page (and, when the popup is filled by AJAX, the popup
+fragment) with a pooled ``requests`` session and parses both with lxml,
+producing the same ``title/url/meta/details`` record as ``ServiceWorker``.
+Requires ``pip install requests lxml``.
+"""
+import re
+import threading
+from urllib.parse import urljoin, urlparse, parse_qs
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    from lxml import html as lxml_html
+except ImportError:
+    requests = None
+    lxml_html = None
+
+import xpaths
+from retry import Failure, TIMEOUT, PARSE_ERROR
+
+USER_AGENT = ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/120.0 Safari/537.36")
+
+# Tags rendered on their own line by the browser, mirrored so text matches Selenium's .text
+BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt",
+    "fieldset", "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4",
+    "h5", "h6", "header", "hr", "li", "main", "nav", "ol", "p", "pre", "section",
+    "table", "tbody", "tfoot", "thead", "tr", "ul",
+}
+SKIP_TAGS = {"script", "style", "noscript", "template", "head", "title"}
+CELL_TAGS = {"td", "th"}
+
+# Source whitespace (newlines included) collapses to one space; only block boundaries break lines
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _collect_text(element, parts):
+    tag = element.tag.lower() if isinstance(element.tag, str) else None
+    if tag is not None and tag not in SKIP_TAGS:
+        block = tag in BLOCK_TAGS
+        if block:
+            parts.append("\n")
+        if element.text:
+            parts.append(_WHITESPACE.sub(" ", element.text))
+        for child in element:
+            _collect_text(child, parts)
+        if block:
+            parts.append("\n")
+        elif tag in CELL_TAGS:
+            parts.append(" ")
+    if element.tail:
+        parts.append(_WHITESPACE.sub(" ", element.tail))
+
+
+def node_text(element):
+    """Approximate the browser's innerText: one line per block, whitespace collapsed"""
+    parts = []
+    if element.text:
+        parts.append(_WHITESPACE.sub(" ", element.text))
+    for child in element:
+        _collect_text(child, parts)
+    lines = (" ".join(line.split()) for line in "".join(parts).split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+def first_text(root, xpath_list):
+    """Return the text of the first XPath that matches, trying fallbacks in order"""
+    for xpath in xpath_list:
+        found = root.xpath(xpath)
+        if found:
+            return node_text(found[0])
+    return ""
+
+
+def parse_popup(popup):
+    """Build the popup "meta" dict from a parsed #popupChitietTTHC element"""
+    popup_data = {}
+    for field, row_xpath in xpaths.POPUP_FIELDS:
+        rows = popup.xpath(row_xpath)
+        values = rows[0].xpath(xpaths.POPUP_VALUE_XPATH) if rows else []
+        popup_data[field] = node_text(values[0]) if values else ""
+
+    legal_basis_rows = []
+    for rows_xpath in xpaths.LEGAL_BASIS_ROW_XPATHS:
+        legal_basis_rows = popup.xpath(rows_xpath)
+        if legal_basis_rows:
+            break
+    legal_basis_list = []
+    for row in legal_basis_rows:
+        cells = [node_text(cell) for cell in row.xpath(".//td")]
+        if len(cells) >= 3:
+            legal_basis_list.append(xpaths.legal_basis_entry(cells))
+    popup_data[xpaths.LEGAL_BASIS_FIELD] = legal_basis_list
+    return popup_data
+
+
+def parse_details(document):
+    """Build the "details" dict from a parsed detail page"""
+    details = {}
+    for field, xpath_list in xpaths.DETAIL_SECTIONS:
+        details[field] = first_text(document, xpath_list)
+
+    ho_so_items = document.xpath(xpaths.HO_SO_ITEMS_XPATH)
+    for item_title in xpaths.HO_SO_ITEM_TITLES:
+        for item in ho_so_items:
+            titles = item.xpath(xpaths.HO_SO_ITEM_TITLE_XPATH)
+            if not titles:
+                details[item_title] = ""
+                break
+            if item_title in node_text(titles[0]):
+                contents = item.xpath(xpaths.HO_SO_ITEM_CONTENT_XPATH)
+                details[item_title] = node_text(contents[0]) if contents else ""
+                break
+
+    for field, xpath_list in xpaths.DETAIL_ARTICLE_SECTIONS:
+        details[field] = first_text(document, xpath_list)
+    return details
+
+
+def find_popup(root):
+    """Return the #popupChitietTTHC element of a document or fragment if it holds any info rows"""
+    popups = root.xpath(xpaths.POPUP_XPATH)
+    if popups and popups[0].xpath(".//div[contains(@class, 'info-row')]"):
+        return popups[0]
+    if root.xpath("./descendant-or-self::div[contains(@class, 'info-row')]"):
+        # AJAX endpoints usually return only the modal body
+        return root
+    return None
+
+
+def parse_service_document(document, service_url, popup_root=None):
+    """Build a service record from a parsed detail page, or None when it has no title"""
+    titles = document.xpath(xpaths.TITLE_XPATH)
+    if not titles:
+        return None
+
+    service_data = {
+        "title": node_text(titles[0]),
+        "url": service_url,
+        "details": {}
+    }
+
+    popup = find_popup(document)
+    if popup is None and popup_root is not None:
+        popup = find_popup(popup_root)
+    service_data["meta"] = parse_popup(popup) if popup is not None else {}
+
+    service_data["details"] = parse_details(document)
+    return service_data
+
+
+def parse_service_page(page_html, service_url, popup_html=None):
+    """Parse detail page HTML (plus optional popup fragment HTML) into a service record"""
+    popup_root = lxml_html.fromstring(popup_html) if popup_html else None
+    return parse_service_document(lxml_html.document_fromstring(page_html), service_url, popup_root)
+
+
+def parse_listing(listing_html, page_url):
+    """(link, row text) for every service of a listing page or search-endpoint fragment"""
+    root = lxml_html.fromstring(listing_html)
+    rows = []
+    for link in root.xpath(xpaths.SERVICE_LINK_XPATH):
+        row = next(link.iterancestors("li"), link)
+        rows.append((urljoin(page_url, link.get("href", "")), node_text(row)))
+    return rows
+
+
+class HttpServiceExtractor:
+    """Extract service details with plain HTTP requests instead of a browser"""
+    def __init__(self, pool_size=10, timeout=15, popup_url_template=None, cache=None, throttle=None):
+        if requests is None or lxml_html is None:
+            raise ImportError("The HTTP engine requires the 'requests' and 'lxml' packages")
+        # popup_url_template may use {url}, {ma_thu_tuc} or any query parameter of the detail url
+        self.popup_url_template = popup_url_template
+        self.timeout = timeout
+        # Optional html_cache.HtmlCache receiving the raw HTML of every extracted service
+        self.cache = cache
+        # Called with the url of every extra request made for a service (the crawler's per-host rate limit)
+        self.throttle = throttle or (lambda url: None)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=2)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = USER_AGENT
+        # The extractor is shared by every consumer thread, so failures are kept per thread
+        self.local = threading.local()
+
+    @property
+    def last_failure(self):
+        """Why the calling thread's last extract_service_details() returned None"""
+        return getattr(self.local, "failure", None)
+
+    def fetch(self, url, referer=None):
+        """GET a url and return its body decoded as text"""
+        headers = {"Referer": referer} if referer else {}
+        response = self.session.get(url, timeout=self.timeout, headers=headers)
+        response.raise_for_status()
+        if "charset" not in response.headers.get("Content-Type", "").lower():
+            # The portal serves UTF-8; requests would otherwise fall back to ISO-8859-1
+            response.encoding = "utf-8"
+        return response.text
+
+    def popup_url(self, document, service_url):
+        """Work out which url fills #popupChitietTTHC for a detail page"""
+        if self.popup_url_template:
+            params = {key: values[0] for key, values in parse_qs(urlparse(service_url).query).items()}
+            params.setdefault("ma_thu_tuc", "")
+            params["url"] = service_url
+            return self.popup_url_template.format(**params)
+
+        # Fall back to whatever the "Xem chi tiết" link points at, when it is not just the modal anchor
+        for link in document.xpath(xpaths.POPUP_LINK_XPATH):
+            for attribute in ("data-url", "data-href", "href"):
+                target = (link.get(attribute) or "").strip()
+                if target and not target.startswith(("#", "javascript:")):
+                    return urljoin(service_url, target)
+        return None
+
+    def extract_service_details(self, service_url):
+        """Extract detailed information for a specific service"""
+        self.local.failure = None
+        try:
+            page_html = self.fetch(service_url)
+            document = lxml_html.document_fromstring(page_html)
+            popup_html = popup_root = None
+            if find_popup(document) is None:
+                popup_url = self.popup_url(document, service_url)
+                if popup_url:
+                    try:
+                        self.throttle(popup_url)
+                        popup_html = self.fetch(popup_url, referer=service_url)
+                        popup_root = lxml_html.fromstring(popup_html)
+                    except requests.RequestException as e:
+                        print(f"HTTP engine: could not fetch popup for {service_url}: {e}")
+
+            service_data = parse_service_document(document, service_url, popup_root)
+            if service_data is None:
+                print(f"HTTP engine: no service title found at {service_url}")
+                self.local.failure = Failure(PARSE_ERROR, "no service title found")
+                return None
+            if self.cache is not None:
+                self.cache.store(service_url, page_html, popup_html)
+            print(f"HTTP engine: Extracted details for: {service_data['title']}")
+            return service_data
+
+        except Exception as e:
+            print(f"HTTP engine: Error extracting service details from {service_url}: {e}")
+            # Network errors are transient like timeouts; anything else means the page did not parse
+            self.local.failure = Failure(TIMEOUT if isinstance(e, requests.RequestException) else PARSE_ERROR, e)
+            return None
+
+    def close(self):
+        """Release pooled connections"""
+        self.session.close()
@@ -0,0 +1,149 @@
+"""Change detection for incremental recrawls.
+
+Every extracted service leaves a fingerprint in the crawl-state database:
+a hash of its listing row, its "Số quyết định" and a hash of the detail page
+content. On an incremental run a service is only re-extracted when one of
+the cheap checks says it changed:
+
+1. the listing row text differs from last time -> changed, extract it;
+2. otherwise the detail page and its popup fragment (filled by AJAX on the
+   portal) are fetched over plain HTTP; a different "Số quyết định" or
+   content hash -> changed, else the stored record is reused.
+
+Without ``requests``/``lxml`` only the listing-row check is available.
+"""
+import hashlib
+import json
+import threading
+
+import xpaths
+
+NEW = "added"
+CHANGED = "updated"
+UNCHANGED = "skipped"
+STALE = "stale"
+
+
+def text_hash(text):
+    return hashlib.sha1(" ".join((text or "").split()).encode("utf-8")).hexdigest()
+
+
+def decision_number(record):
+    return ((record or {}).get("meta") or {}).get("Số quyết định", "")
+
+
+class ChangeDetector:
+    """Decide per URL whether a full extraction is needed and keep the run report"""
+    def __init__(self, state, http_extractor=None, throttle=None, popup_url_template=None):
+        self.state = state
+        self.http_extractor = http_extractor
+        # Called with each url before it is fetched (the crawler passes its per-host rate limit)
+        self.throttle = throttle or (lambda url: None)
+        if http_extractor is None:
+            try:
+                from http_engine import HttpServiceExtractor
+                # Without the template the AJAX-filled popup (and so "Số quyết định") cannot be fetched
+                self.http_extractor = HttpServiceExtractor(popup_url_template=popup_url_template)
+            except ImportError:
+                print("Incremental mode without requests/lxml: only listing rows are compared")
+        self.lock = threading.Lock()
+        self.counts = {NEW: 0, CHANGED: 0, UNCHANGED: 0, STALE: 0}
+        self.stale_urls = []
+        self.unchanged_by = {"row": 0, "content": 0}
+        self.decision_changes = 0
+        self.seen_urls = set()
+
+    def fetch_content(self, url):
+        """(content hash, Số quyết định) of a detail page and its popup fetched over HTTP, or (None, None)"""
+        if self.http_extractor is None:
+            return None, None
+        from http_engine import lxml_html, node_text, parse_details, parse_popup, find_popup
+        try:
+            self.throttle(url)
+            document = lxml_html.document_fromstring(self.http_extractor.fetch(url))
+            popup = find_popup(document)
+            if popup is None:
+                # Popup được nạp bằng AJAX: lấy fragment riêng để meta (Số quyết định, Căn cứ pháp lý) nằm trong hash
+                popup_url = self.http_extractor.popup_url(document, url)
+                if popup_url:
+                    self.throttle(popup_url)
+                    popup = find_popup(lxml_html.fromstring(self.http_extractor.fetch(popup_url, referer=url)))
+        except Exception as e:
+            print(f"Could not fetch {url} for change detection: {e}")
+            return None, None
+        titles = document.xpath(xpaths.TITLE_XPATH)
+        meta = parse_popup(popup) if popup is not None else {}
+        content = {
+            "title": node_text(titles[0]) if titles else "",
+            "details": parse_details(document),
+            "meta": meta,
+        }
+        content_hash = hashlib.sha1(json.dumps(content, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+        return content_hash, decision_number({"meta": meta})
+
+    def content_hash(self, url):
+        return self.fetch_content(url)[0]
+
+    def check(self, url, row_text):
+        """Return (status, previous record, content hash) for a listed service"""
+        with self.lock:
+            self.seen_urls.add(url)
+        previous = self.state.fingerprint(url)
+        if previous is None or previous["record"] is None:
+            return NEW, None, None
+
+        row_hash = text_hash(row_text) if row_text is not None else None
+        if row_hash is not None and row_hash != previous["row_hash"]:
+            return CHANGED, previous["record"], None
+
+        if self.http_extractor is None:
+            # Không có HTTP engine: chỉ so sánh được dòng trong danh sách
+            return (UNCHANGED if row_hash is not None else CHANGED), previous["record"], None
+
+        current_hash, current_decision = self.fetch_content(url)
+        if current_decision and current_decision != previous["decision_number"]:
+            return CHANGED, previous["record"], current_hash
+        if current_hash is not None and current_hash == previous["content_hash"]:
+            return UNCHANGED, previous["record"], current_hash
+        return CHANGED, previous["record"], current_hash
+
+    def record_unchanged(self, via_content):
+        with self.lock:
+            self.counts[UNCHANGED] += 1
+            self.unchanged_by["content" if via_content else "row"] += 1
+
+    def record_stale(self, url):
+        """A changed (or unverifiable) service failed every attempt; its previous record was kept"""
+        with self.lock:
+            self.counts[STALE] += 1
+            self.stale_urls.append(url)
+
+    def remember(self, url, row_text, record, status=None, previous_record=None, content_hash=None, compute_hash=False):
+        """Store the fingerprint of a freshly extracted record and count it in the report"""
+        if compute_hash and content_hash is None:
+            content_hash = self.content_hash(url)
+        row_hash = text_hash(row_text) if row_text is not None else None
+        self.state.save_fingerprint(url, row_hash, decision_number(record), content_hash, record)
+        if status is None:
+            return
+        with self.lock:
+            self.counts[status] += 1
+            if status == CHANGED and decision_number(record) != decision_number(previous_record):
+                self.decision_changes += 1
+
+    def print_report(self):
+        removed = len(self.state.fingerprinted_urls() - self.seen_urls)
+        print("Incremental crawl report:")
+        print(f"  Skipped (unchanged): {self.counts[UNCHANGED]} "
+              f"({self.unchanged_by['row']} by listing row, {self.unchanged_by['content']} by content hash)")
+        print(f"  Updated: {self.counts[CHANGED]} ({self.decision_changes} with a new Số quyết định)")
+        print(f"  Added: {self.counts[NEW]}")
+        if self.counts[STALE]:
+            print(f"  Stale (re-extraction failed, previous record kept): {self.counts[STALE]}")
+            for url in self.stale_urls:
+                print(f"    {url}")
+        print(f"  No longer listed: {removed}")
+
+    def close(self):
+        if self.http_extractor is not None:
+            self.http_extractor.close()
@@ -0,0 +1,291 @@
+"""Per-stage timing, throughput and error metrics for a crawl.
+
+Hot stages (pagination, listing reads, ``driver.get``, popup open/extract/
+close, every detail section, ``save_data``) are timed with
+``Metrics.timer(stage, worker)``. Durations go into a fixed-bucket histogram
+per stage and worker, so memory stays constant however long the crawl runs;
+p50/p95/p99 are estimated from the buckets on demand. Metrics can be scraped as Prometheus
+text from ``MetricsServer`` (``--metrics-port``), written periodically as a
+JSON snapshot by ``SnapshotWriter`` (``--metrics-snapshot``), and are
+summarised at the end of every crawl.
+"""
+import bisect
+import contextlib
+import json
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, math.ceil(fraction * len(samples)) - 1))
+    return samples[index]
+
+
+# Upper bounds in seconds, growing by sqrt(2) from 1 ms to about 6 minutes; slower samples land in +Inf
+BUCKETS = tuple(round(0.001 * 2 ** (i / 2), 6) for i in range(38))
+
+
+class Histogram:
+    """Counts of durations per bucket, with their sum and maximum"""
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def copy(self):
+        histogram = Histogram()
+        histogram.merge(self)
+        return histogram
+
+    def merge(self, other):
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def quantile(self, fraction):
+        """Estimate of a quantile, interpolated linearly inside its bucket"""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                lower = BUCKETS[index - 1] if index else 0.0
+                upper = min(BUCKETS[index] if index < len(BUCKETS) else self.max, self.max)
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.max
+
+    def cumulative_buckets(self):
+        """(upper bound, samples at or below it) pairs, ending with +Inf"""
+        total = 0
+        buckets = []
+        for bound, count in zip(BUCKETS + (float("inf"),), self.counts):
+            total += count
+            buckets.append((bound, total))
+        return buckets
+
+
+def _distribution(histogram):
+    return {
+        "count": histogram.count,
+        "sum": histogram.sum,
+        "p50": histogram.quantile(0.50),
+        "p95": histogram.quantile(0.95),
+        "p99": histogram.quantile(0.99),
+        "max": histogram.max,
+    }
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+class Metrics:
+    """Thread-safe stage durations and counters, labelled by worker"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.histograms = {}
+        self.errors = {}
+        self.counters = {}
+
+    def observe(self, stage, seconds, worker="main"):
+        key = (stage, str(worker))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, name, worker="main", amount=1, **labels):
+        key = (name, str(worker), tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    @contextlib.contextmanager
+    def timer(self, stage, worker="main"):
+        """Time the block as ``stage``; an exception escaping it also counts as an error of the stage"""
+        start = time.time()
+        try:
+            yield
+        except Exception:
+            with self.lock:
+                self.errors[(stage, str(worker))] = self.errors.get((stage, str(worker)), 0) + 1
+            raise
+        finally:
+            self.observe(stage, time.time() - start, worker)
+
+    def _copy(self):
+        with self.lock:
+            histograms = {key: histogram.copy() for key, histogram in self.histograms.items()}
+            return histograms, dict(self.errors), dict(self.counters)
+
+    @staticmethod
+    def _by_stage(histograms):
+        """{stage: (aggregate histogram, {worker: histogram})}"""
+        stages = {}
+        for (stage, worker), histogram in sorted(histograms.items()):
+            aggregate, per_worker = stages.setdefault(stage, (Histogram(), {}))
+            aggregate.merge(histogram)
+            per_worker[worker] = histogram
+        return stages
+
+    def snapshot(self):
+        """Aggregate and per-worker distributions, error counts and counters as plain data"""
+        histograms, errors, counters = self._copy()
+        elapsed = time.time() - self.started
+
+        stages = {}
+        for stage, (aggregate_histogram, per_worker) in self._by_stage(histograms).items():
+            aggregate = _distribution(aggregate_histogram)
+            aggregate["errors"] = sum(count for (name, worker), count in errors.items() if name == stage)
+            aggregate["workers"] = {}
+            for worker, histogram in per_worker.items():
+                row = _distribution(histogram)
+                row["errors"] = errors.get((stage, worker), 0)
+                aggregate["workers"][worker] = row
+            stages[stage] = aggregate
+
+        counter_rows = [
+            {"name": name, "worker": worker, "labels": dict(labels), "value": value}
+            for (name, worker, labels), value in sorted(counters.items())
+        ]
+        services = sum(row["value"] for row in counter_rows if row["name"] == "services")
+        return {
+            "timestamp": time.time(),
+            "elapsed_seconds": elapsed,
+            "services_per_second": services / elapsed if elapsed > 0 else 0.0,
+            "stages": stages,
+            "counters": counter_rows,
+        }
+
+    def prometheus_text(self):
+        """The metrics in the Prometheus text exposition format (stages as histograms)"""
+        histograms = self._copy()[0]
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP crawler_stage_seconds Duration of each crawl stage",
+            "# TYPE crawler_stage_seconds histogram",
+        ]
+        # Buckets add up across workers, so the scraper aggregates them with sum() and histogram_quantile()
+        for (stage, worker), histogram in sorted(histograms.items()):
+            labels = f'stage="{_label(stage)}",worker="{_label(worker)}"'
+            for bound, count in histogram.cumulative_buckets():
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f'crawler_stage_seconds_bucket{{{labels},le="{le}"}} {count}')
+            lines.append(f"crawler_stage_seconds_sum{{{labels}}} {histogram.sum:.6f}")
+            lines.append(f"crawler_stage_seconds_count{{{labels}}} {histogram.count}")
+
+        lines += ["# HELP crawler_stage_errors_total Stage executions that raised",
+                  "# TYPE crawler_stage_errors_total counter"]
+        for stage, aggregate in snapshot["stages"].items():
+            for worker, row in aggregate["workers"].items():
+                lines.append(f'crawler_stage_errors_total{{stage="{_label(stage)}",worker="{_label(worker)}"}} '
+                             f"{row['errors']}")
+
+        names = sorted({row["name"] for row in snapshot["counters"]})
+        for name in names:
+            lines.append(f"# TYPE crawler_{name}_total counter")
+            for row in snapshot["counters"]:
+                if row["name"] != name:
+                    continue
+                labels = [f'worker="{_label(row["worker"])}"']
+                labels += [f'{key}="{_label(value)}"' for key, value in row["labels"].items()]
+                lines.append(f"crawler_{name}_total{{{','.join(labels)}}} {row['value']}")
+
+        lines += ["# TYPE crawler_services_per_second gauge",
+                  f"crawler_services_per_second {snapshot['services_per_second']:.6f}"]
+        return "\n".join(lines) + "\n"
+
+    def print_summary(self):
+        snapshot = self.snapshot()
+        print(f"Stage timings (seconds), {snapshot['services_per_second']:.2f} services/s "
+              f"over {snapshot['elapsed_seconds']:.0f}s:")
+        for stage, row in snapshot["stages"].items():
+            print(f"  {stage:<32} n={row['count']:<6} errors={row['errors']:<4} p50={row['p50']:.2f} "
+                  f"p95={row['p95']:.2f} p99={row['p99']:.2f} total={row['sum']:.1f}")
+
+        per_worker = {}
+        for row in snapshot["counters"]:
+            if row["name"] == "services":
+                counts = per_worker.setdefault(row["worker"], {})
+                result = row["labels"].get("result", "")
+                counts[result] = counts.get(result, 0) + row["value"]
+        for worker, counts in sorted(per_worker.items()):
+            details = ", ".join(f"{result} {count}" for result, count in sorted(counts.items()))
+            print(f"  Worker {worker}: {sum(counts.values())} services ({details})")
+
+
+class MetricsServer:
+    """Serves ``GET /metrics`` in the Prometheus text format from a background thread"""
+    def __init__(self, metrics, port, host="0.0.0.0"):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split("?")[0] not in ("/", "/metrics"):
+                    handler.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode("utf-8")
+                handler.send_response(200)
+                handler.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics-server")
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+        print(f"Serving metrics on http://{self.server.server_address[0]}:{self.server.server_address[1]}/metrics")
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SnapshotWriter:
+    """Rewrites a JSON snapshot of the metrics every ``interval`` seconds (and once more on close)"""
+    def __init__(self, metrics, path, interval=30.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="metrics-snapshot")
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def write(self):
+        # Written aside and renamed so readers never see a half-written file
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(self.metrics.snapshot(), f, ensure_ascii=False, indent=2)
+        os.replace(temporary_path, self.path)
+
+    def _run(self):
+        while not self.stop.wait(self.interval):
+            self.write()
+
+    def close(self):
+        self.stop.set()
+        self.write()
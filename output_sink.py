@@ -0,0 +1,195 @@
+"""Append-only JSON Lines output for crawled services.
+
+Every record is written as one line as soon as a worker extracts it, so the
+crawler never holds the whole dataset in memory and never rewrites earlier
+output. Streams may be gzip (``.jsonl.gz``) or zstd (``.jsonl.zst``,
+requires ``pip install zstandard``) compressed; the consolidated JSON array
+is only built on demand from the stream.
+
+A crash can leave a half-written last line (plain streams) or an
+unterminated gzip member / zstd frame. Before appending, ``JsonlSink``
+repairs the stream back to its last complete record so new records are
+never glued onto, or hidden behind, a broken tail.
+
+Usage:
+    python output_sink.py consolidate hoabinh_services.jsonl.gz hoabinh_services_complete.json
+"""
+import argparse
+import gzip
+import io
+import json
+import os
+import threading
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_EXTENSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+# Raised when reading a compressed stream whose tail was cut off or garbled by a crash
+CORRUPT_STREAM_ERRORS = (EOFError, zlib.error, gzip.BadGzipFile) + ((zstandard.ZstdError,) if zstandard else ())
+
+
+def stream_path(base_name, compression=None):
+    """File name of the JSON Lines stream for a base name and compression"""
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError(f"Unknown compression: {compression}")
+    return f"{base_name}.jsonl{COMPRESSION_EXTENSIONS[compression]}"
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise ImportError("zstd streams require the 'zstandard' package")
+
+
+def open_stream(path, mode="r"):
+    """Open a (possibly compressed) JSON Lines file as text; mode is 'r', 'w' or 'a'"""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    if path.endswith(".zst"):
+        _require_zstandard()
+        if mode == "r":
+            raw = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True, closefd=True)
+        else:
+            # Appending starts a new zstd frame; readers decode across frames
+            raw = zstandard.ZstdCompressor().stream_writer(open(path, mode + "b"), closefd=True)
+        return io.TextIOWrapper(raw, encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def iter_records(path):
+    """Yield records from a stream, stopping quietly at a truncated tail left by a crash"""
+    try:
+        with open_stream(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    print(f"Skipping truncated record in {path}")
+    except CORRUPT_STREAM_ERRORS as e:
+        print(f"Stream {path} ends with an incomplete or corrupt block: {e}")
+
+
+def _truncate_to_last_line(path):
+    """Cut a plain stream back to just after its last newline; return the bytes dropped"""
+    with open(path, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        position = size
+        while position > 0:
+            step = min(65536, position)
+            f.seek(position - step)
+            chunk = f.read(step)
+            newline = chunk.rfind(b"\n")
+            if newline >= 0:
+                position = position - step + newline + 1
+                break
+            position -= step
+        if position < size:
+            f.truncate(position)
+        return size - position
+
+
+def repair_stream(path):
+    """Bring a stream left by a crash back to its last complete record before appending to it"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    if not path.endswith((".gz", ".zst")):
+        dropped = _truncate_to_last_line(path)
+        if dropped:
+            print(f"Dropped a truncated {dropped}-byte record from the end of {path}")
+        return
+
+    # A compressed stream must end with a terminated member/frame; otherwise keep what decodes and rewrite it
+    lines = []
+    clean = True
+    try:
+        with open_stream(path) as f:
+            for line in f:
+                lines.append(line)
+    except CORRUPT_STREAM_ERRORS:
+        clean = False
+    if lines and not lines[-1].endswith("\n"):
+        lines.pop()
+        clean = False
+    if clean:
+        return
+    # Same extension, so the rewrite is compressed the same way
+    root, extension = os.path.splitext(path)
+    temporary_path = f"{root}.repair{extension}"
+    with open_stream(temporary_path, "w") as f:
+        f.writelines(lines)
+    os.replace(temporary_path, path)
+    print(f"Rewrote {path} without its unterminated tail ({len(lines)} complete records kept)")
+
+
+def consolidate(source_path, json_path, indent=4):
+    """Build the classic JSON array file from a stream without loading it into memory"""
+    count = 0
+    # A service re-extracted after an interrupted run appears twice in the stream; keep the first copy
+    seen_urls = set()
+    with open(json_path, "w", encoding="utf-8") as out:
+        out.write("[")
+        for record in iter_records(source_path):
+            url = record.get("url")
+            if url in seen_urls:
+                continue
+            if url:
+                seen_urls.add(url)
+            out.write(",\n" if count else "\n")
+            text = json.dumps(record, ensure_ascii=False, indent=indent)
+            if indent:
+                text = "\n".join(" " * indent + line for line in text.split("\n"))
+            out.write(text)
+            count += 1
+        out.write("\n]" if count else "]")
+    return count
+
+
+class JsonlSink:
+    """Thread-safe append-only writer; each record is one JSON line"""
+    def __init__(self, path, append=False, flush_every=1):
+        if append:
+            repair_stream(path)
+        self.path = path
+        self.flush_every = flush_every
+        self.lock = threading.Lock()
+        self.count = 0
+        self.file = open_stream(path, "a" if append else "w")
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self.lock:
+            self.file.write(line + "\n")
+            self.count += 1
+            if self.count % self.flush_every == 0:
+                self.file.flush()
+
+    def flush(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Work with crawler JSON Lines streams")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    consolidate_parser = subparsers.add_parser("consolidate", help="build a JSON array file from a stream")
+    consolidate_parser.add_argument("stream")
+    consolidate_parser.add_argument("output")
+    consolidate_parser.add_argument("--indent", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.command == "consolidate":
+        total = consolidate(args.stream, args.output, args.indent or None)
+        print(f"Wrote {total} services to {args.output}")
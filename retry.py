@@ -0,0 +1,137 @@
+"""Retry queue with exponential backoff and a dead-letter file for failed services.
+
+Failed extractions are classified, held back for ``base_delay * 2 ** (attempt - 1)``
+seconds (capped, with jitter) and then handed back to the crawl pipeline,
+preferably to a different worker. Services still failing after
+``max_attempts`` are appended to a JSON Lines dead-letter file that can be
+replayed on its own with ``python crawl.py --replay <file>``.
+"""
+import heapq
+import itertools
+import json
+import random
+import threading
+import time
+
+TIMEOUT = "timeout"
+POPUP_MISSING = "popup-missing"
+DRIVER_CRASH = "driver-crash"
+PARSE_ERROR = "parse-error"
+FAILURE_KINDS = (TIMEOUT, POPUP_MISSING, DRIVER_CRASH, PARSE_ERROR)
+
+
+class Failure:
+    """Why one extraction attempt failed"""
+    def __init__(self, kind, message=""):
+        self.kind = kind
+        self.message = str(message)
+
+    def __str__(self):
+        return f"{self.kind}: {self.message}" if self.message else self.kind
+
+
+class RetryQueue:
+    """Holds failed tasks until their backoff expires, then resubmits them"""
+    def __init__(self, submit, max_attempts=3, base_delay=5.0, max_delay=300.0):
+        self.submit = submit
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.heap = []
+        self.counter = itertools.count()
+        self.pending = 0
+        self.condition = threading.Condition()
+        self.closed = False
+        self.counts = {kind: 0 for kind in FAILURE_KINDS}
+        self.thread = threading.Thread(target=self._run, name="retry-queue")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def delay(self, attempt):
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    def schedule(self, task, failure, delay=None):
+        """Queue task for another attempt; return False when it has used up its attempts"""
+        if task.attempt >= self.max_attempts:
+            return False
+        if delay is None:
+            delay = self.delay(task.attempt)
+        task.attempt += 1
+        with self.condition:
+            self.counts[failure.kind] = self.counts.get(failure.kind, 0) + 1
+            heapq.heappush(self.heap, (time.time() + delay, next(self.counter), task))
+            self.pending += 1
+            self.condition.notify_all()
+        print(f"Retrying {task.link} in {delay:.1f}s (attempt {task.attempt}/{self.max_attempts}, {failure})")
+        return True
+
+    def has_pending(self):
+        with self.condition:
+            return self.pending > 0
+
+    def wait_idle(self):
+        """Block until every scheduled retry has been handed back to the pipeline"""
+        with self.condition:
+            while self.pending > 0:
+                self.condition.wait()
+
+    def print_summary(self):
+        retried = ", ".join(f"{kind} {count}" for kind, count in self.counts.items() if count)
+        print(f"Retries scheduled: {sum(self.counts.values())}" + (f" ({retried})" if retried else ""))
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.closed and (not self.heap or self.heap[0][0] > time.time()):
+                    timeout = self.heap[0][0] - time.time() if self.heap else None
+                    self.condition.wait(timeout)
+                if self.closed:
+                    return
+                ready_at, order, task = heapq.heappop(self.heap)
+            # submit() may block on the bounded link queue, so call it without holding the lock
+            self.submit(task)
+            with self.condition:
+                self.pending -= 1
+                self.condition.notify_all()
+
+
+class DeadLetterFile:
+    """Append-only JSON Lines record of services that failed every attempt"""
+    def __init__(self, path, append=False):
+        self.path = path
+        self.lock = threading.Lock()
+        self.count = 0
+        self.file = open(path, "a" if append else "w", encoding="utf-8")
+
+    def write(self, task, failure, partial_record=None):
+        entry = {
+            "url": task.link,
+            "page": task.page,
+            "attempts": task.attempt,
+            "kind": failure.kind,
+            "message": failure.message,
+            "failed_at": time.time(),
+            "partial_record": partial_record,
+        }
+        with self.lock:
+            self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.file.flush()
+            self.count += 1
+        print(f"Dead-lettered {task.link} after {task.attempt} attempts ({failure})")
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+    @staticmethod
+    def load(path):
+        """Entries of a dead-letter file, for replaying them"""
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
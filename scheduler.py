@@ -0,0 +1,145 @@
+"""Per-host rate limiting and adaptive (AIMD) concurrency for detail extraction.
+
+Every extraction passes through ``Scheduler.slot(url)``: it first waits for
+one of the currently allowed concurrency slots, then takes a token from the
+host's token bucket (in that order, so threads blocked on the limiter do not
+hoard tokens and burst once slots free up). Every further request to the
+portal (popup fragments, Selenium fallbacks, listing pages from the search
+endpoint, incremental change checks) takes its own token through
+``Scheduler.throttle(url)``, so the per-host rate covers all traffic. After each window of completed requests the
+allowed concurrency is raised by one when latency and error rate are
+healthy, and halved when they are not, always staying within the
+configured bounds.
+"""
+import contextlib
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, at most ``burst`` saved up"""
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available; return the seconds spent waiting"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return waited
+                delay = (1.0 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class AdaptiveLimiter:
+    """Concurrency limit adjusted with additive increase / multiplicative decrease"""
+    def __init__(self, min_limit, max_limit, initial=None, window=20,
+                 target_latency=10.0, max_error_rate=0.2, decrease_factor=0.5):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(self.max_limit, max(self.min_limit, initial or self.max_limit))
+        self.window = window
+        self.target_latency = target_latency
+        self.max_error_rate = max_error_rate
+        self.decrease_factor = decrease_factor
+        self.active = 0
+        self.samples = []
+        self.condition = threading.Condition()
+        self.decisions = []
+
+    def acquire(self):
+        with self.condition:
+            while self.active >= self.limit:
+                self.condition.wait()
+            self.active += 1
+
+    def release(self, latency, ok):
+        with self.condition:
+            self.active -= 1
+            self.samples.append((latency, ok))
+            if len(self.samples) >= self.window:
+                self._adjust()
+            self.condition.notify_all()
+
+    def _adjust(self):
+        latencies = [latency for latency, ok in self.samples]
+        average_latency = sum(latencies) / len(latencies)
+        error_rate = sum(1 for latency, ok in self.samples if not ok) / len(self.samples)
+        self.samples = []
+
+        previous = self.limit
+        if error_rate > self.max_error_rate or average_latency > self.target_latency:
+            self.limit = max(self.min_limit, int(self.limit * self.decrease_factor))
+            reason = "backing off"
+        else:
+            self.limit = min(self.max_limit, self.limit + 1)
+            reason = "healthy, probing"
+        self.decisions.append((time.time(), previous, self.limit, average_latency, error_rate))
+        if self.limit != previous:
+            print(f"Scheduler: {reason}: workers {previous} -> {self.limit} "
+                  f"(avg latency {average_latency:.2f}s, error rate {error_rate:.0%})")
+
+
+class SlotResult:
+    """Outcome of one scheduled extraction, reported back to the limiter"""
+    def __init__(self):
+        self.ok = True
+
+
+class Scheduler:
+    """Rate limits each host and adapts the number of concurrent extractions"""
+    def __init__(self, min_workers, max_workers, rate_per_host=None, burst=None, **limiter_options):
+        self.rate_per_host = rate_per_host
+        self.burst = burst
+        self.buckets = {}
+        self.buckets_lock = threading.Lock()
+        self.limiter = AdaptiveLimiter(min_workers, max_workers, **limiter_options)
+        self.throttled_seconds = 0.0
+
+    def bucket(self, url):
+        host = urlparse(url).netloc
+        with self.buckets_lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.rate_per_host, self.burst)
+            return self.buckets[host]
+
+    def throttle(self, url):
+        """Wait for a token of the url's host (no-op without a rate limit)"""
+        if self.rate_per_host:
+            waited = self.bucket(url).acquire()
+            with self.buckets_lock:
+                self.throttled_seconds += waited
+
+    @contextlib.contextmanager
+    def slot(self, url):
+        """Hold one rate-limited concurrency slot; set ``result.ok = False`` to report a failure"""
+        self.limiter.acquire()
+        result = SlotResult()
+        start = time.time()
+        try:
+            self.throttle(url)
+            start = time.time()
+            yield result
+        except Exception:
+            result.ok = False
+            raise
+        finally:
+            self.limiter.release(time.time() - start, result.ok)
+
+    def print_summary(self):
+        print(f"Scheduler: final worker limit {self.limiter.limit} "
+              f"(bounds {self.limiter.min_limit}-{self.limiter.max_limit}), "
+              f"{len(self.limiter.decisions)} adjustment rounds, "
+              f"{self.throttled_seconds:.1f} worker-seconds waiting for the rate limit")
+
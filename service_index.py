@@ -0,0 +1,294 @@
+"""Persistent indexes for querying crawled services without loading the dataset.
+
+``build`` reads a crawl's output (JSON Lines stream or ``_complete.json``)
+once and writes an SQLite index file holding:
+
+- every record, stored as JSON and fetched by id only when a hit is returned;
+- exact-match indexes on every meta field ("Mã thủ tục", "Lĩnh vực",
+  "Cơ quan thực hiện", ...), compared case- and whitespace-insensitively;
+- an inverted full-text index over the detail sections. Text is folded for
+  Vietnamese before tokenizing (``đ`` -> ``d``, tones and vowel marks
+  removed, lower case), so "trinh tu" matches "Trình tự".
+
+Postings are clustered by term (``WITHOUT ROWID``) and the file is opened
+memory-mapped, so a lookup only touches the few pages it needs and returns
+in milliseconds regardless of the dataset size.
+
+Usage:
+    python service_index.py build hoabinh_services.jsonl --index hoabinh_services.idx
+    python service_index.py get --index hoabinh_services.idx "Mã thủ tục" 1.000000
+    python service_index.py get --index hoabinh_services.idx "Lĩnh vực" "Đất đai" --titles
+    python service_index.py search --index hoabinh_services.idx "nop ho so truc tuyen" --section "Trình tự thực hiện"
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+import unicodedata
+from collections import Counter
+
+import xpaths
+from output_sink import iter_records
+
+SCHEMA = """
+CREATE TABLE services (
+    service_id INTEGER PRIMARY KEY,
+    url TEXT,
+    title TEXT,
+    record TEXT
+);
+CREATE TABLE fields (
+    field_id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL
+);
+CREATE TABLE exact (
+    field_id INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    service_id INTEGER NOT NULL,
+    PRIMARY KEY (field_id, key, service_id)
+) WITHOUT ROWID;
+CREATE TABLE postings (
+    term TEXT NOT NULL,
+    service_id INTEGER NOT NULL,
+    field_id INTEGER NOT NULL,
+    hits INTEGER NOT NULL,
+    PRIMARY KEY (term, service_id, field_id)
+) WITHOUT ROWID;
+CREATE TABLE source (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+META = "meta"
+SECTION = "section"
+
+_TOKEN = re.compile(r"\w+")
+
+
+def fold(text):
+    """Lower-case text with Vietnamese diacritics removed ("Đất đai" -> "dat dai")"""
+    text = text.replace("đ", "d").replace("Đ", "D")
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(char for char in decomposed if unicodedata.category(char) != "Mn").lower()
+
+
+def tokenize(text):
+    return _TOKEN.findall(fold(text or ""))
+
+
+def exact_key(value):
+    """Key of the exact-match index: case and runs of whitespace are ignored, diacritics are not"""
+    return " ".join(str(value).split()).casefold()
+
+
+def read_records(source_path):
+    """Records of a stream, or of a consolidated JSON array file"""
+    if source_path.endswith(".json"):
+        with open(source_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return iter_records(source_path)
+
+
+def _source_signature(source_path):
+    stat = os.stat(source_path)
+    return {"path": os.path.abspath(source_path), "size": str(stat.st_size), "mtime": str(stat.st_mtime)}
+
+
+def build_index(source_path, index_path, batch_size=5000):
+    """Build the index file from a crawl's output; return the number of services indexed"""
+    start = time.time()
+    temporary_path = f"{index_path}.tmp"
+    if os.path.exists(temporary_path):
+        os.remove(temporary_path)
+    connection = sqlite3.connect(temporary_path)
+    connection.execute("PRAGMA journal_mode=OFF")
+    connection.execute("PRAGMA synchronous=OFF")
+    connection.executescript(SCHEMA)
+
+    field_ids = {}
+
+    def field_id(kind, name):
+        key = (kind, name)
+        if key not in field_ids:
+            field_ids[key] = len(field_ids) + 1
+            connection.execute("INSERT INTO fields (field_id, kind, name) VALUES (?, ?, ?)",
+                               (field_ids[key], kind, name))
+        return field_ids[key]
+
+    seen_urls = set()
+    services, exact, postings = [], [], []
+
+    def flush():
+        connection.executemany("INSERT INTO services VALUES (?, ?, ?, ?)", services)
+        connection.executemany("INSERT OR IGNORE INTO exact VALUES (?, ?, ?)", exact)
+        connection.executemany("INSERT INTO postings VALUES (?, ?, ?, ?)", postings)
+        del services[:], exact[:], postings[:]
+
+    for record in read_records(source_path):
+        url = record.get("url")
+        if url in seen_urls:
+            continue
+        seen_urls.add(url)
+        service_id = len(seen_urls)
+        services.append((service_id, url, record.get("title", ""),
+                         json.dumps(record, ensure_ascii=False, separators=(",", ":"))))
+
+        for field, value in (record.get("meta") or {}).items():
+            if field != xpaths.LEGAL_BASIS_FIELD and value:
+                exact.append((field_id(META, field), exact_key(value), service_id))
+        for section, text in (record.get("details") or {}).items():
+            section_id = field_id(SECTION, section)
+            for term, hits in Counter(tokenize(text)).items():
+                postings.append((term, service_id, section_id, hits))
+        # The title is searchable as its own section
+        for term, hits in Counter(tokenize(record.get("title", ""))).items():
+            postings.append((term, service_id, field_id(SECTION, "title"), hits))
+
+        if len(postings) >= batch_size * 20 or len(services) >= batch_size:
+            flush()
+    flush()
+
+    connection.executemany("INSERT INTO source (key, value) VALUES (?, ?)",
+                           list(_source_signature(source_path).items()))
+    connection.commit()
+    connection.execute("ANALYZE")
+    connection.close()
+    os.replace(temporary_path, index_path)
+    print(f"Indexed {len(seen_urls)} services from {source_path} into {index_path} "
+          f"({os.path.getsize(index_path) / 1024 / 1024:.1f} MB) in {time.time() - start:.1f}s")
+    return len(seen_urls)
+
+
+class ServiceIndex:
+    """Read-only lookups over an index file; records are loaded only for the hits returned"""
+    def __init__(self, index_path, mmap_size=256 * 1024 * 1024):
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(f"No index at {index_path}; run: python service_index.py build <output> --index {index_path}")
+        self.connection = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True, check_same_thread=False)
+        self.connection.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        self.fields = {(kind, name): field_id
+                       for field_id, kind, name in self.connection.execute("SELECT field_id, kind, name FROM fields")}
+
+    def source_path(self):
+        """Path of the output the index was built from"""
+        row = self.connection.execute("SELECT value FROM source WHERE key = 'path'").fetchone()
+        return row[0] if row else None
+
+    def is_stale(self, source_path=None):
+        """True when the output the index was built from (or ``source_path``) has changed since"""
+        source_path = source_path or self.source_path()
+        if not source_path or not os.path.exists(source_path):
+            return False
+        stored = dict(self.connection.execute("SELECT key, value FROM source"))
+        current = _source_signature(source_path)
+        return any(stored.get(key) != value for key, value in current.items() if key != "path")
+
+    def field_names(self, kind=META):
+        return sorted(name for field_kind, name in self.fields if field_kind == kind)
+
+    def lookup(self, field, value, limit=None):
+        """Ids of the services whose meta ``field`` equals ``value``"""
+        field_id = self.fields.get((META, field))
+        if field_id is None:
+            raise KeyError(f"Unknown meta field: {field} (known: {', '.join(self.field_names())})")
+        rows = self.connection.execute(
+            "SELECT service_id FROM exact WHERE field_id = ? AND key = ? ORDER BY service_id LIMIT ?",
+            (field_id, exact_key(value), -1 if limit is None else limit)
+        )
+        return [row[0] for row in rows]
+
+    def search(self, text, section=None, limit=20):
+        """[(service id, score)] of services containing every term of ``text``, best first"""
+        terms = sorted(set(tokenize(text)))
+        if not terms:
+            return []
+        params = list(terms)
+        section_filter = ""
+        if section is not None:
+            field_id = self.fields.get((SECTION, section))
+            if field_id is None:
+                raise KeyError(f"Unknown section: {section} (known: {', '.join(self.field_names(SECTION))})")
+            section_filter = " AND field_id = ?"
+            params.append(field_id)
+        # A service matches when every term appears in it (in the chosen section, if any)
+        rows = self.connection.execute(
+            f"SELECT service_id, SUM(hits) FROM postings WHERE term IN ({', '.join('?' for _ in terms)})"
+            f"{section_filter} GROUP BY service_id HAVING COUNT(DISTINCT term) = ? "
+            f"ORDER BY SUM(hits) DESC, service_id LIMIT ?",
+            params + [len(terms), limit]
+        )
+        return rows.fetchall()
+
+    def titles(self, service_ids):
+        """{service id: (title, url)} without decoding the stored records"""
+        if not service_ids:
+            return {}
+        rows = self.connection.execute(
+            f"SELECT service_id, title, url FROM services WHERE service_id IN ({', '.join('?' for _ in service_ids)})",
+            list(service_ids)
+        )
+        return {service_id: (title, url) for service_id, title, url in rows}
+
+    def get(self, service_id):
+        """The full record of one service"""
+        row = self.connection.execute("SELECT record FROM services WHERE service_id = ?", (service_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def close(self):
+        self.connection.close()
+
+
+def _print_hits(index, hits, full_records):
+    info = index.titles([service_id for service_id, _ in hits])
+    for service_id, score in hits:
+        if full_records:
+            print(json.dumps(index.get(service_id), ensure_ascii=False, indent=2))
+        else:
+            title, url = info.get(service_id, ("", ""))
+            suffix = f" (score {score})" if score is not None else ""
+            print(f"  [{service_id}] {title}{suffix}\n      {url}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and query persistent indexes over crawled services")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="index a crawl output once")
+    build_parser.add_argument("source", help="JSON Lines stream (.jsonl/.jsonl.gz/.jsonl.zst) or _complete.json")
+    build_parser.add_argument("--index", default="hoabinh_services.idx")
+    get_parser = subparsers.add_parser("get", help="services whose meta field equals a value")
+    get_parser.add_argument("field", help='meta field, e.g. "Mã thủ tục", "Lĩnh vực", "Cơ quan thực hiện"')
+    get_parser.add_argument("value")
+    search_parser = subparsers.add_parser("search", help="full-text search over the detail sections")
+    search_parser.add_argument("text")
+    search_parser.add_argument("--section", help='restrict to one section, e.g. "Trình tự thực hiện"')
+    for query_parser in (get_parser, search_parser):
+        query_parser.add_argument("--index", default="hoabinh_services.idx")
+        query_parser.add_argument("--limit", type=int, default=20)
+        query_parser.add_argument("--titles", action="store_true", help="print titles and urls instead of records")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_index(args.source, args.index)
+    else:
+        index = ServiceIndex(args.index)
+        if index.is_stale():
+            print(f"Warning: {index.source_path()} has changed since {args.index} was built; "
+                  f"rebuild with: python service_index.py build {index.source_path()} --index {args.index}",
+                  file=sys.stderr)
+        start = time.time()
+        try:
+            if args.command == "get":
+                hits = [(service_id, None) for service_id in index.lookup(args.field, args.value, args.limit)]
+            else:
+                hits = index.search(args.text, args.section, args.limit)
+        except KeyError as e:
+            parser.exit(1, f"{e.args[0]}\n")
+        elapsed = time.time() - start
+        _print_hits(index, hits, not args.titles)
+        print(f"{len(hits)} services in {elapsed * 1000:.1f} ms")
+        index.close()
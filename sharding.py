@@ -0,0 +1,307 @@
+"""Sharded crawling across processes and machines.
+
+The listing is opened once to count its pages, and the page range is split
+into shards written to a lease directory. Any number of worker processes,
+on this host or on other hosts sharing the directory (e.g. over NFS), claim
+shards through atomic lease files, crawl their page range into a per-shard
+stream and mark the shard done. A worker that dies stops renewing its lease;
+once the lease expires another worker takes the shard over and resumes it
+from the shard's crawl-state database. That database lives in the shared
+directory so it can be resumed from any host, and therefore uses a rollback
+journal instead of WAL, whose shared-memory index does not work over NFS.
+Each lease file carries a token of the worker that holds it, and a worker
+only marks a shard done (or drops its lease) while the token is still its
+own, so a worker that stalled past its lease cannot complete a shard that
+was taken over meanwhile. The merge step combines the shard
+outputs in shard order, sorted by URL within a shard, so the result does not
+depend on which worker ran what.
+
+Usage:
+    python sharding.py plan  --lease-dir shards --shards 8
+    python sharding.py work  --lease-dir shards --workers 4        # on every host
+    python sharding.py merge --lease-dir shards --output hoabinh_services
+    python sharding.py run   --lease-dir shards --shards 8 --processes 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+
+from output_sink import JsonlSink, iter_records, stream_path, consolidate
+
+
+class LeaseDirectory:
+    """Shard specs, leases, done markers and outputs kept in one shared directory"""
+    def __init__(self, root, lease_seconds=600):
+        self.root = root
+        self.lease_seconds = lease_seconds
+        self.shard_dir = os.path.join(root, "shards")
+        self.lease_dir = os.path.join(root, "leases")
+        self.done_dir = os.path.join(root, "done")
+        self.output_dir = os.path.join(root, "outputs")
+        # Token written into each lease this process holds, by shard id
+        self.tokens = {}
+        for directory in (self.shard_dir, self.lease_dir, self.done_dir, self.output_dir):
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def shard_name(shard_id):
+        return f"shard-{shard_id:04d}"
+
+    def write_plan(self, total_pages, shard_count):
+        """Split pages 1..total_pages into contiguous ranges, one spec file per shard"""
+        if self.shards():
+            raise RuntimeError(f"{self.shard_dir} already holds a plan")
+        shard_count = max(1, min(shard_count, total_pages))
+        specs = []
+        start_page = 1
+        for shard_id in range(shard_count):
+            size = total_pages // shard_count + (1 if shard_id < total_pages % shard_count else 0)
+            spec = {"shard": shard_id, "start_page": start_page, "end_page": start_page + size - 1,
+                    "total_pages": total_pages}
+            start_page += size
+            with open(os.path.join(self.shard_dir, self.shard_name(shard_id) + ".json"), "w") as f:
+                json.dump(spec, f)
+            specs.append(spec)
+        return specs
+
+    def shards(self):
+        specs = []
+        for name in sorted(os.listdir(self.shard_dir)):
+            if name.endswith(".json"):
+                with open(os.path.join(self.shard_dir, name)) as f:
+                    specs.append(json.load(f))
+        return specs
+
+    def _lease_path(self, spec):
+        return os.path.join(self.lease_dir, self.shard_name(spec["shard"]) + ".lease")
+
+    def _done_path(self, spec):
+        return os.path.join(self.done_dir, self.shard_name(spec["shard"]) + ".done")
+
+    def is_done(self, spec):
+        return os.path.exists(self._done_path(spec))
+
+    def pending_shards(self):
+        return [spec for spec in self.shards() if not self.is_done(spec)]
+
+    def _create_lease(self, spec, path):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        token = uuid.uuid4().hex
+        with os.fdopen(fd, "w") as f:
+            json.dump({"host": socket.gethostname(), "pid": os.getpid(), "claimed_at": time.time(), "token": token}, f)
+        self.tokens[spec["shard"]] = token
+        return True
+
+    def owns(self, spec):
+        """True while the shard's lease is still the one this process created"""
+        token = self.tokens.get(spec["shard"])
+        if token is None:
+            return False
+        try:
+            with open(self._lease_path(spec)) as f:
+                return json.load(f).get("token") == token
+        except (FileNotFoundError, ValueError):
+            # Missing, or still being written by the worker that took the shard over
+            return False
+
+    def _try_lease(self, spec):
+        path = self._lease_path(spec)
+        if self._create_lease(spec, path):
+            return True
+        try:
+            expired = os.path.getmtime(path) + self.lease_seconds < time.time()
+        except FileNotFoundError:
+            return self._create_lease(spec, path)
+        if not expired:
+            return False
+        # Only one worker can rename the expired lease away; that worker takes the shard over
+        try:
+            os.rename(path, f"{path}.expired-{uuid.uuid4().hex}")
+        except FileNotFoundError:
+            return False
+        print(f"Taking over expired lease of {self.shard_name(spec['shard'])}")
+        return self._create_lease(spec, path)
+
+    def claim(self, exclude=()):
+        """Lease the first shard that is neither done nor leased by a live worker"""
+        for spec in self.shards():
+            if spec["shard"] in exclude:
+                continue
+            if not self.is_done(spec) and self._try_lease(spec):
+                return spec
+        return None
+
+    def renew(self, spec):
+        if not self.owns(spec):
+            return
+        try:
+            os.utime(self._lease_path(spec))
+        except FileNotFoundError:
+            pass
+
+    def complete(self, spec):
+        """Mark the shard done; return False (and leave it alone) when the lease was taken over"""
+        if not self.owns(spec):
+            print(f"Lost the lease of {self.shard_name(spec['shard'])}; leaving it to the worker that took it over")
+            self.tokens.pop(spec["shard"], None)
+            return False
+        with open(self._done_path(spec), "w") as f:
+            json.dump({"host": socket.gethostname(), "finished_at": time.time()}, f)
+        self.release(spec)
+        return True
+
+    def release(self, spec):
+        # Never remove a lease another worker has created since ours expired
+        if self.owns(spec):
+            try:
+                os.remove(self._lease_path(spec))
+            except FileNotFoundError:
+                pass
+        self.tokens.pop(spec["shard"], None)
+
+    def output_base(self, spec):
+        return os.path.join(self.output_dir, self.shard_name(spec["shard"]))
+
+
+def plan(root, shard_count, crawler_options=None):
+    """Count the listing pages once and write the shard plan"""
+    from crawl import HoaBinhServiceCrawler
+    crawler = HoaBinhServiceCrawler(**(crawler_options or {}))
+    try:
+        total_pages = crawler.open_listing()
+    finally:
+        crawler.driver.quit()
+    if total_pages <= 0:
+        raise RuntimeError("Could not determine the number of listing pages")
+    specs = LeaseDirectory(root).write_plan(total_pages, shard_count)
+    for spec in specs:
+        print(f"Shard {spec['shard']}: pages {spec['start_page']}-{spec['end_page']}")
+    return specs
+
+
+def _heartbeat(leases, spec, stop):
+    while not stop.wait(leases.lease_seconds / 3):
+        leases.renew(spec)
+
+
+def work(root, crawler_options=None, lease_seconds=600):
+    """Claim and crawl shards until none is left; return the number of shards crawled"""
+    from crawl import HoaBinhServiceCrawler
+    leases = LeaseDirectory(root, lease_seconds)
+    crawled = 0
+    failed = set()
+    while True:
+        spec = leases.claim(exclude=failed)
+        if spec is None:
+            break
+        name = leases.shard_name(spec["shard"])
+        print(f"[{socket.gethostname()}:{os.getpid()}] crawling {name} "
+              f"(pages {spec['start_page']}-{spec['end_page']})")
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=_heartbeat, args=(leases, spec, stop))
+        heartbeat.daemon = True
+        heartbeat.start()
+        try:
+            output_base = leases.output_base(spec)
+            options = dict(crawler_options or {})
+            options.update(output_name=output_base, state_path=output_base + ".db", state_journal="DELETE",
+                           consolidate_output=False)
+            crawler = HoaBinhServiceCrawler(**options)
+            if crawler.crawl(spec["start_page"], spec["end_page"]):
+                if leases.complete(spec):
+                    crawled += 1
+            else:
+                # Leave the shard to be retried (and resumed) by another worker
+                failed.add(spec["shard"])
+                leases.release(spec)
+        finally:
+            stop.set()
+    return crawled
+
+
+def merge(root, output_name="hoabinh_services", compression=None):
+    """Combine every shard output into one stream and JSON file in a deterministic order"""
+    leases = LeaseDirectory(root)
+    unfinished = leases.pending_shards()
+    if unfinished:
+        print(f"Warning: {len(unfinished)} shards are not done; merging what is available")
+
+    merged_path = stream_path(output_name, compression)
+    sink = JsonlSink(merged_path, flush_every=1000)
+    seen_urls = set()
+    try:
+        for spec in leases.shards():
+            shard_stream = stream_path(leases.output_base(spec))
+            if not os.path.exists(shard_stream):
+                continue
+            # Thứ tự ghi trong một shard phụ thuộc vào luồng nào xong trước, nên sắp xếp theo URL
+            records = sorted(iter_records(shard_stream), key=lambda record: record.get("url", ""))
+            for record in records:
+                if record.get("url") in seen_urls:
+                    continue
+                seen_urls.add(record.get("url"))
+                sink.write(record)
+    finally:
+        sink.close()
+
+    count = consolidate(merged_path, f"{output_name}_complete.json")
+    print(f"Merged {count} services from {len(leases.shards())} shards into {merged_path}")
+    return count
+
+
+def _work_process(root, crawler_options, lease_seconds):
+    work(root, crawler_options, lease_seconds)
+
+
+def run_local(root, shard_count, processes, crawler_options=None, output_name="hoabinh_services", lease_seconds=600):
+    """Plan (if needed), crawl with several local processes, then merge"""
+    if not LeaseDirectory(root).shards():
+        plan(root, shard_count, {"base_url": (crawler_options or {}).get("base_url"), "max_workers": 1})
+    workers = [
+        multiprocessing.Process(target=_work_process, args=(root, crawler_options, lease_seconds))
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return merge(root, output_name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sharded crawling coordinated through a lease directory")
+    parser.add_argument("command", choices=["plan", "work", "merge", "run"])
+    parser.add_argument("--lease-dir", default="shards", help="directory shared by every worker")
+    parser.add_argument("--shards", type=int, default=8, help="number of page-range shards (plan/run)")
+    parser.add_argument("--processes", type=int, default=2, help="local worker processes (run)")
+    parser.add_argument("--lease-seconds", type=int, default=600,
+                        help="a shard whose lease is not renewed for this long is taken over")
+    parser.add_argument("--output", default="hoabinh_services", help="base name of the merged output (merge/run)")
+    parser.add_argument("--workers", type=int, default=4, help="parallel workers inside each process")
+    parser.add_argument("--engine", choices=["selenium", "http"], default="selenium")
+    parser.add_argument("--extraction-mode", choices=["elements", "script"], default="elements")
+    parser.add_argument("--base-url", help="listing page url")
+    parser.add_argument("--browser-profile", choices=["full", "lean"], default="full")
+    args = parser.parse_args()
+
+    from browser_profile import BrowserProfile
+    options = {"max_workers": args.workers, "engine": args.engine,
+               "extraction_mode": args.extraction_mode, "base_url": args.base_url,
+               "browser_profile": BrowserProfile(args.browser_profile)}
+    if args.command == "plan":
+        plan(args.lease_dir, args.shards, {"base_url": args.base_url, "max_workers": 1})
+    elif args.command == "work":
+        print(f"Crawled {work(args.lease_dir, options, args.lease_seconds)} shards")
+    elif args.command == "merge":
+        merge(args.lease_dir, args.output)
+    else:
+        run_local(args.lease_dir, args.shards, args.processes, options, args.output, args.lease_seconds)
@@ -0,0 +1,242 @@
+"""Normalized, columnar export of the crawled services.
+
+The JSON output repeats every meta value and the full "Căn cứ pháp lý" list
+in each service, although the same laws and decrees are cited by hundreds of
+services. This stage reads the JSON Lines stream once and splits it into
+tables:
+
+    services           service_id, url, title
+    meta               service_id, field, value
+    details            service_id, section, text
+    documents          document_id, so_ky_hieu, trich_yeu, ngay_ban_hanh, co_quan_ban_hanh
+    service_documents  service_id, document_id, position
+
+Each distinct legal document is stored once and linked to the services that
+cite it. Repeated strings are dictionary-encoded: in SQLite every
+``field``/``value``/``section``/``text``/issuer/date column holds an id into
+a shared ``strings`` table (the ``*_text`` views join them back); in Parquet
+(``pip install pyarrow``) those columns are Arrow dictionary arrays.
+
+Usage:
+    python crawl.py --export-tables sqlite
+    python table_export.py hoabinh_services.jsonl.gz hoabinh_services_tables.sqlite
+    python table_export.py hoabinh_services.jsonl --format parquet
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+import xpaths
+from output_sink import iter_records
+
+TABLES = {
+    "services": ["service_id", "url", "title"],
+    "meta": ["service_id", "field", "value"],
+    "details": ["service_id", "section", "text"],
+    "documents": ["document_id", "so_ky_hieu", "trich_yeu", "ngay_ban_hanh", "co_quan_ban_hanh"],
+    "service_documents": ["service_id", "document_id", "position"],
+}
+
+# Columns whose values repeat across services and are stored as dictionary codes
+DICTIONARY_COLUMNS = {
+    "meta": {"field", "value"},
+    "details": {"section", "text"},
+    "documents": {"ngay_ban_hanh", "co_quan_ban_hanh"},
+}
+
+EXPORT_EXTENSIONS = {"sqlite": ".sqlite", "parquet": ""}
+
+
+def export_path(output_name, export_format):
+    """Where the tables of a crawl are written: one SQLite file or one Parquet directory"""
+    return f"{output_name}_tables{EXPORT_EXTENSIONS[export_format]}"
+
+
+def normalize(records):
+    """Yield (table, row) for every service of a stream, each URL and legal document only once"""
+    seen_urls = set()
+    documents = {}
+    for record in records:
+        url = record.get("url")
+        if url in seen_urls:
+            continue
+        seen_urls.add(url)
+        service_id = len(seen_urls)
+        yield "services", (service_id, url, record.get("title", ""))
+
+        meta = record.get("meta") or {}
+        for field, value in meta.items():
+            if field != xpaths.LEGAL_BASIS_FIELD:
+                yield "meta", (service_id, field, value)
+        for field, text in (record.get("details") or {}).items():
+            yield "details", (service_id, field, text)
+
+        for position, entry in enumerate(meta.get(xpaths.LEGAL_BASIS_FIELD) or []):
+            key = tuple(entry.get(column, "") for column in xpaths.LEGAL_BASIS_COLUMNS)
+            document_id = documents.get(key)
+            if document_id is None:
+                document_id = documents[key] = len(documents) + 1
+                yield "documents", (document_id,) + key
+            yield "service_documents", (service_id, document_id, position)
+
+
+class SqliteTableWriter:
+    """Writes the tables into one SQLite file, repeated strings interned in a ``strings`` table"""
+    def __init__(self, path, batch_size=5000):
+        if os.path.exists(path):
+            os.remove(path)
+        self.path = path
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(path)
+        self.strings = {}
+        self.pending = {table: [] for table in TABLES}
+
+        statements = ["CREATE TABLE strings (id INTEGER PRIMARY KEY, value TEXT NOT NULL)"]
+        for table, columns in TABLES.items():
+            encoded = DICTIONARY_COLUMNS.get(table, set())
+            definitions = [f"{column}_id INTEGER" if column in encoded else f"{column} {self._type(column)}"
+                           for column in columns]
+            statements.append(f"CREATE TABLE {table} ({', '.join(definitions)})")
+            if encoded:
+                # The views read like the logical table, with dictionary codes resolved
+                selects, joins = [], []
+                for column in columns:
+                    if column in encoded:
+                        selects.append(f"{column}_strings.value AS {column}")
+                        joins.append(f"JOIN strings AS {column}_strings ON {column}_strings.id = {table}.{column}_id")
+                    else:
+                        selects.append(f"{table}.{column}")
+                statements.append(f"CREATE VIEW {table}_text AS SELECT {', '.join(selects)} FROM {table} {' '.join(joins)}")
+        self.connection.executescript(";\n".join(statements) + ";")
+
+    @staticmethod
+    def _type(column):
+        return "INTEGER" if column.endswith("_id") or column == "position" else "TEXT"
+
+    def _code(self, value):
+        code = self.strings.get(value)
+        if code is None:
+            code = self.strings[value] = len(self.strings) + 1
+            self.connection.execute("INSERT INTO strings (id, value) VALUES (?, ?)", (code, value))
+        return code
+
+    def add(self, table, row):
+        encoded = DICTIONARY_COLUMNS.get(table)
+        if encoded:
+            row = tuple(self._code(value or "") if column in encoded else value
+                        for column, value in zip(TABLES[table], row))
+        self.pending[table].append(row)
+        if len(self.pending[table]) >= self.batch_size:
+            self._flush(table)
+
+    def _flush(self, table):
+        rows = self.pending[table]
+        if rows:
+            placeholders = ", ".join("?" for _ in TABLES[table])
+            self.connection.executemany(f"INSERT INTO {table} VALUES ({placeholders})", rows)
+            self.pending[table] = []
+
+    def close(self):
+        for table in TABLES:
+            self._flush(table)
+        self.connection.executescript("""
+            CREATE INDEX meta_service ON meta(service_id);
+            CREATE INDEX details_service ON details(service_id);
+            CREATE INDEX service_documents_service ON service_documents(service_id);
+            CREATE INDEX service_documents_document ON service_documents(document_id);
+        """)
+        self.connection.commit()
+        self.connection.execute("VACUUM")
+        self.connection.close()
+
+
+class ParquetTableWriter:
+    """Writes each table as a Parquet file of a directory, repeated strings as Arrow dictionaries"""
+    def __init__(self, directory, row_group_size=50000):
+        if pyarrow is None:
+            raise ImportError("Parquet export requires the 'pyarrow' package")
+        os.makedirs(directory, exist_ok=True)
+        self.path = directory
+        self.row_group_size = row_group_size
+        self.pending = {table: [] for table in TABLES}
+        self.writers = {}
+
+    def add(self, table, row):
+        self.pending[table].append(row)
+        if len(self.pending[table]) >= self.row_group_size:
+            self._flush(table)
+
+    def _flush(self, table):
+        rows = self.pending[table]
+        if not rows and table in self.writers:
+            return
+        encoded = DICTIONARY_COLUMNS.get(table, set())
+        arrays = []
+        for index, column in enumerate(TABLES[table]):
+            values = [row[index] for row in rows]
+            if column in encoded:
+                arrays.append(pyarrow.array(values, pyarrow.string()).dictionary_encode())
+            elif column.endswith("_id") or column == "position":
+                arrays.append(pyarrow.array(values, pyarrow.int64()))
+            else:
+                arrays.append(pyarrow.array(values, pyarrow.string()))
+        batch = pyarrow.Table.from_arrays(arrays, names=TABLES[table])
+        if table not in self.writers:
+            self.writers[table] = pyarrow.parquet.ParquetWriter(
+                os.path.join(self.path, f"{table}.parquet"), batch.schema, compression="zstd", use_dictionary=True
+            )
+        self.writers[table].write_table(batch)
+        self.pending[table] = []
+
+    def close(self):
+        for table in TABLES:
+            self._flush(table)
+        for writer in self.writers.values():
+            writer.close()
+
+
+def _size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path)
+
+
+def export_tables(source_path, output_path, export_format="sqlite"):
+    """Normalize a JSON Lines stream into tables; return the row count of each table"""
+    if export_format not in EXPORT_EXTENSIONS:
+        raise ValueError(f"Unknown export format: {export_format}")
+    start = time.time()
+    writer = SqliteTableWriter(output_path) if export_format == "sqlite" else ParquetTableWriter(output_path)
+    counts = {table: 0 for table in TABLES}
+    try:
+        for table, row in normalize(iter_records(source_path)):
+            writer.add(table, row)
+            counts[table] += 1
+    finally:
+        writer.close()
+
+    print(f"Exported {counts['services']} services, {counts['documents']} distinct legal documents "
+          f"({counts['service_documents']} citations) to {output_path} in {time.time() - start:.1f}s")
+    print(f"  {_size(source_path) / 1024 / 1024:.1f} MB stream -> {_size(output_path) / 1024 / 1024:.1f} MB tables")
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a crawl stream as normalized SQLite or Parquet tables")
+    parser.add_argument("stream", help="JSON Lines stream written by crawl.py (.jsonl, .jsonl.gz or .jsonl.zst)")
+    parser.add_argument("output", nargs="?", help="SQLite file or Parquet directory (default: <stream>_tables)")
+    parser.add_argument("--format", choices=sorted(EXPORT_EXTENSIONS), default="sqlite")
+    args = parser.parse_args()
+
+    output = args.output
+    if output is None:
+        base_name = args.stream.split(".jsonl")[0]
+        output = export_path(base_name, args.format)
+    export_tables(args.stream, output, args.format)
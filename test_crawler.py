@@ -0,0 +1,310 @@
+"""Offline tests for the crawler's building blocks.
+
+Everything runs against ``fixture_server`` and temporary files, without a
+browser or the live portal. The HTTP engine tests are skipped when
+``requests``/``lxml`` are not installed.
+
+Usage:
+    python -m pytest -q test_crawler.py
+    python -m unittest test_crawler
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import http_engine
+import xpaths
+from fixture_server import FixtureServer, FixtureSite, DEFAULT_AGENCY, DETAIL_PATH, FIELDS, SEARCH_PATH
+from crawl_state import CrawlState, DONE, IN_FLIGHT, PENDING
+from html_cache import HtmlCache
+from metrics import percentile
+from output_sink import JsonlSink, consolidate
+from retry import Failure, RetryQueue, TIMEOUT
+from scheduler import AdaptiveLimiter, TokenBucket
+from service_index import fold
+from sharding import LeaseDirectory
+from table_export import normalize
+
+HTTP_ENGINE = http_engine.requests is not None and http_engine.lxml_html is not None
+
+
+class TemporaryDirectoryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="crawler-test-")
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+
+@unittest.skipUnless(HTTP_ENGINE, "the HTTP engine requires requests and lxml")
+class HttpEngineTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.site = FixtureSite(services=12)
+        cls.server = FixtureServer(cls.site).start()
+        cls.extractor = http_engine.HttpServiceExtractor(pool_size=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.extractor.close()
+        cls.server.close()
+
+    def service_url(self, service_id):
+        return f"{self.server.url}{DETAIL_PATH}?ma_thu_tuc={self.site.code(service_id)}"
+
+    def test_extract_service_details_matches_fixture(self):
+        url = self.service_url(3)
+        record = self.extractor.extract_service_details(url)
+        self.assertIsNotNone(record, self.extractor.last_failure)
+        self.assertEqual(record["title"], self.site.title(3))
+        self.assertEqual(record["url"], url)
+        self.assertEqual(record["meta"]["Mã thủ tục"], self.site.code(3))
+        self.assertEqual(record["meta"]["Lĩnh vực"], FIELDS[3 % len(FIELDS)])
+        self.assertIn("Bước 1:", record["details"]["Trình tự thực hiện"])
+        legal_basis = record["meta"][xpaths.LEGAL_BASIS_FIELD]
+        self.assertTrue(legal_basis)
+        for entry in legal_basis:
+            self.assertEqual(sorted(entry), sorted(xpaths.LEGAL_BASIS_COLUMNS))
+            self.assertTrue(entry["Số ký hiệu"].endswith("/NĐ-CP"))
+
+    def test_missing_service_reports_timeout(self):
+        # The fixture answers 404 for unknown services, which requests raises as a transient error
+        self.assertIsNone(self.extractor.extract_service_details(self.service_url(999)))
+        self.assertEqual(self.extractor.last_failure.kind, TIMEOUT)
+
+    def test_parse_listing_matches_fixture(self):
+        url = f"{self.server.url}{SEARCH_PATH}?pCoQuanId={DEFAULT_AGENCY}&page=2&pageSize=5"
+        rows = http_engine.parse_listing(self.extractor.fetch(url), url)
+        expected = self.site.listed(DEFAULT_AGENCY)[5:10]
+        self.assertEqual([link for link, _ in rows], [self.service_url(service_id) for service_id in expected])
+        for (_, row_text), service_id in zip(rows, expected):
+            self.assertIn(self.site.title(service_id), row_text)
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=20, burst=2)
+        self.assertEqual(bucket.acquire(), 0.0)
+        self.assertEqual(bucket.acquire(), 0.0)
+        start = time.monotonic()
+        for _ in range(4):
+            bucket.acquire()
+        # Four tokens beyond the burst arrive at 20 per second
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+
+class AdaptiveLimiterTest(unittest.TestCase):
+    def run_window(self, limiter, latency, ok):
+        for _ in range(limiter.window):
+            limiter.acquire()
+            limiter.release(latency, ok)
+
+    def test_additive_increase_multiplicative_decrease(self):
+        limiter = AdaptiveLimiter(2, 8, initial=4, window=5, target_latency=1.0, max_error_rate=0.2)
+        self.run_window(limiter, 0.1, True)
+        self.assertEqual(limiter.limit, 5)
+        self.run_window(limiter, 5.0, True)
+        self.assertEqual(limiter.limit, 2)
+        self.run_window(limiter, 0.1, False)
+        self.assertEqual(limiter.limit, 2)
+        for _ in range(10):
+            self.run_window(limiter, 0.1, True)
+        self.assertEqual(limiter.limit, 8)
+
+    def test_acquire_blocks_at_limit(self):
+        limiter = AdaptiveLimiter(1, 1, window=100)
+        limiter.acquire()
+        acquired = threading.Event()
+        waiter = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+        waiter.start()
+        self.assertFalse(acquired.wait(0.1))
+        limiter.release(0.1, True)
+        self.assertTrue(acquired.wait(1.0))
+        waiter.join()
+
+
+class Task:
+    def __init__(self, link):
+        self.link = link
+        self.page = 1
+        self.attempt = 1
+
+
+class RetryQueueTest(unittest.TestCase):
+    def test_resubmits_until_attempts_are_used_up(self):
+        submitted = []
+        retries = RetryQueue(submitted.append, max_attempts=2, base_delay=0.01)
+        self.addCleanup(retries.close)
+        task = Task("http://example/1")
+        self.assertTrue(retries.schedule(task, Failure(TIMEOUT)))
+        retries.wait_idle()
+        self.assertEqual(submitted, [task])
+        self.assertEqual(task.attempt, 2)
+        self.assertFalse(retries.schedule(task, Failure(TIMEOUT)))
+        self.assertEqual(retries.counts[TIMEOUT], 1)
+
+    def test_earliest_deadline_first(self):
+        submitted = []
+        retries = RetryQueue(submitted.append, max_attempts=3)
+        self.addCleanup(retries.close)
+        late, early = Task("late"), Task("early")
+        retries.schedule(late, Failure(TIMEOUT), delay=0.2)
+        retries.schedule(early, Failure(TIMEOUT), delay=0.01)
+        retries.wait_idle()
+        self.assertEqual([task.link for task in submitted], ["early", "late"])
+
+
+class LeaseDirectoryTest(TemporaryDirectoryTest):
+    def test_claims_each_shard_once(self):
+        first = LeaseDirectory(self.directory)
+        first.write_plan(total_pages=5, shard_count=2)
+        second = LeaseDirectory(self.directory)
+        claimed = [first.claim(), second.claim()]
+        self.assertEqual(sorted(spec["shard"] for spec in claimed), [0, 1])
+        self.assertIsNone(second.claim())
+        self.assertEqual([(spec["start_page"], spec["end_page"]) for spec in first.shards()], [(1, 3), (4, 5)])
+
+    def test_expired_lease_is_taken_over(self):
+        dead = LeaseDirectory(self.directory, lease_seconds=60)
+        dead.write_plan(total_pages=2, shard_count=1)
+        spec = dead.claim()
+        live = LeaseDirectory(self.directory, lease_seconds=60)
+        self.assertIsNone(live.claim())
+
+        # The dead worker stopped renewing its lease two minutes ago
+        lease_path = live._lease_path(spec)
+        stale = time.time() - 120
+        os.utime(lease_path, (stale, stale))
+        taken = live.claim()
+        self.assertEqual(taken["shard"], spec["shard"])
+        self.assertIsNone(LeaseDirectory(self.directory, lease_seconds=60).claim())
+
+        # The stalled worker wakes up: it can neither complete the shard nor drop the new lease
+        self.assertFalse(dead.owns(spec))
+        self.assertFalse(dead.complete(spec))
+        self.assertFalse(live.is_done(taken))
+        self.assertTrue(live.owns(taken))
+
+        self.assertTrue(live.complete(taken))
+        self.assertTrue(live.is_done(taken))
+        self.assertEqual(live.pending_shards(), [])
+
+
+class CrawlStateTest(TemporaryDirectoryTest):
+    def status(self, state, url):
+        state.flush()
+        return state.connection.execute("SELECT status, page, attempts FROM urls WHERE url = ?", (url,)).fetchone()
+
+    def test_retry_puts_url_back_to_pending(self):
+        state = CrawlState(self.path("state.db"))
+        self.addCleanup(state.close)
+        state.begin_run()
+        state.mark_pending("a", 3)
+        state.mark_in_flight("a")
+        self.assertEqual(self.status(state, "a"), (IN_FLIGHT, 3, 1))
+        state.mark_pending("a", 3)
+        self.assertEqual(self.status(state, "a"), (PENDING, 3, 1))
+        state.mark_in_flight("a")
+        state.mark_done("a")
+        self.assertEqual(self.status(state, "a"), (DONE, 3, 2))
+        self.assertEqual(state.completed_urls(), {"a"})
+
+
+class HtmlCacheTest(TemporaryDirectoryTest):
+    def test_concurrent_stores_are_indexed_and_deduplicated(self):
+        cache = HtmlCache(self.path("cache"), batch_size=7)
+        self.addCleanup(cache.close)
+        popup = "<div>shared popup</div>"
+
+        def store(worker):
+            for number in range(25):
+                cache.store(f"http://example/{worker}/{number}", f"<h1>{worker} {number}</h1>", popup)
+
+        workers = [threading.Thread(target=store, args=(worker,)) for worker in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(len(cache.entries()), 100)
+        self.assertEqual(cache.load("http://example/2/7"), ("<h1>2 7</h1>", popup))
+        self.assertIsNone(cache.load("http://example/missing"))
+        self.assertEqual(cache.disk_usage()[0], 101)
+
+
+class ConsolidateTest(TemporaryDirectoryTest):
+    def test_keeps_first_copy_of_each_url(self):
+        stream = self.path("services.jsonl")
+        sink = JsonlSink(stream)
+        for record in ({"url": "a", "title": "first"}, {"url": "b", "title": "b"},
+                       {"url": "a", "title": "again"}, {"title": "no url"}, {"title": "no url"}):
+            sink.write(record)
+        sink.close()
+
+        self.assertEqual(consolidate(stream, self.path("services.json")), 4)
+        with open(self.path("services.json"), encoding="utf-8") as f:
+            records = json.load(f)
+        self.assertEqual([record["title"] for record in records], ["first", "b", "no url", "no url"])
+
+    def test_append_after_crash_drops_partial_line(self):
+        stream = self.path("services.jsonl")
+        sink = JsonlSink(stream)
+        sink.write({"url": "a"})
+        sink.close()
+        with open(stream, "a", encoding="utf-8") as f:
+            f.write('{"url": "b", "tit')
+        sink = JsonlSink(stream, append=True)
+        sink.write({"url": "c"})
+        sink.close()
+        self.assertEqual(consolidate(stream, self.path("services.json")), 2)
+
+
+class PercentileTest(unittest.TestCase):
+    def test_nearest_rank(self):
+        samples = list(range(1, 11))
+        self.assertEqual(percentile(samples, 0.50), 5)
+        self.assertEqual(percentile(samples, 0.95), 10)
+        self.assertEqual(percentile(samples, 0.10), 1)
+        self.assertEqual(percentile(samples, 0.0), 1)
+        self.assertEqual(percentile(samples, 1.0), 10)
+        self.assertEqual(percentile([1, 2, 3, 4], 0.50), 2)
+        self.assertEqual(percentile([], 0.50), 0.0)
+
+
+class NormalizeTest(unittest.TestCase):
+    def test_documents_are_shared_and_urls_deduplicated(self):
+        law = {"Số ký hiệu": "1/2020/NĐ-CP", "Trích yếu": "Luật", "Ngày ban hành": "01/01/2020",
+               "Cơ quan ban hành": "Chính phủ"}
+        decree = dict(law, **{"Số ký hiệu": "2/2021/NĐ-CP"})
+        records = [
+            {"url": "a", "title": "A", "meta": {"Lĩnh vực": "Đất đai", xpaths.LEGAL_BASIS_FIELD: [law, decree]},
+             "details": {"Trình tự thực hiện": "Bước 1"}},
+            {"url": "b", "title": "B", "meta": {"Lĩnh vực": "Thuế", xpaths.LEGAL_BASIS_FIELD: [decree]}},
+            {"url": "a", "title": "A again"},
+        ]
+        rows = {}
+        for table, row in normalize(records):
+            rows.setdefault(table, []).append(row)
+
+        self.assertEqual(rows["services"], [(1, "a", "A"), (2, "b", "B")])
+        self.assertEqual(rows["meta"], [(1, "Lĩnh vực", "Đất đai"), (2, "Lĩnh vực", "Thuế")])
+        self.assertEqual(rows["details"], [(1, "Trình tự thực hiện", "Bước 1")])
+        self.assertEqual([row[:2] for row in rows["documents"]], [(1, "1/2020/NĐ-CP"), (2, "2/2021/NĐ-CP")])
+        self.assertEqual(rows["service_documents"], [(1, 1, 0), (1, 2, 1), (2, 2, 0)])
+
+
+class FoldTest(unittest.TestCase):
+    def test_removes_vietnamese_diacritics(self):
+        self.assertEqual(fold("Đất đai"), "dat dai")
+        self.assertEqual(fold("Trình tự thực hiện"), "trinh tu thuc hien")
+        self.assertEqual(fold("ỦY BAN NHÂN DÂN"), "uy ban nhan dan")
+        self.assertEqual(fold("Mã 1.000003"), "ma 1.000003")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+"""Condition-driven waits that replace fixed sleeps and record how long each one took"""
+import time
+import threading
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+import xpaths
+from metrics import percentile
+
+# Timeout (seconds) per named condition; tune them from the numbers printed by WaitStats
+DEFAULT_TIMEOUTS = {
+    "listing_ready": 15,
+    "page_size": 10,
+    "page_change": 15,
+    "service_links": 10,
+    "page_load": 10,
+    "popup_link": 10,
+    "popup_visible": 10,
+    "popup_loaded": 10,
+    "popup_hidden": 5,
+    "network_idle": 10,
+}
+
+# True when the document has loaded and no jQuery AJAX request is in flight
+NETWORK_IDLE_SCRIPT = (
+    "return document.readyState === 'complete' && "
+    "(typeof jQuery === 'undefined' || jQuery.active === 0);"
+)
+
+
+class WaitStats:
+    """Thread-safe record of how long each named wait actually took"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.durations = {}
+        self.timeouts = {}
+
+    def record(self, name, seconds, timed_out):
+        with self.lock:
+            self.durations.setdefault(name, []).append(seconds)
+            if timed_out:
+                self.timeouts[name] = self.timeouts.get(name, 0) + 1
+
+    def summary(self):
+        """Return count, timeouts and latency percentiles for every condition"""
+        with self.lock:
+            snapshot = {name: sorted(values) for name, values in self.durations.items()}
+            timeouts = dict(self.timeouts)
+        return {
+            name: {
+                "count": len(values),
+                "timeouts": timeouts.get(name, 0),
+                "avg": sum(values) / len(values),
+                "p50": percentile(values, 0.50),
+                "p95": percentile(values, 0.95),
+                "max": values[-1],
+            }
+            for name, values in snapshot.items()
+        }
+
+    def print_summary(self):
+        print("Wait stats (seconds):")
+        for name, row in sorted(self.summary().items()):
+            print(f"  {name:<14} n={row['count']:<6} timeouts={row['timeouts']:<4} "
+                  f"avg={row['avg']:.2f} p50={row['p50']:.2f} p95={row['p95']:.2f} max={row['max']:.2f}")
+
+
+class WaitEngine:
+    """Waits for readiness conditions on one driver, with per-condition timeouts"""
+    def __init__(self, driver, stats=None, timeouts=None, poll_frequency=0.1):
+        self.driver = driver
+        self.stats = stats if stats is not None else WaitStats()
+        self.timeouts = dict(DEFAULT_TIMEOUTS)
+        self.timeouts.update(timeouts or {})
+        self.poll_frequency = poll_frequency
+
+    def until(self, name, condition, timeout=None):
+        """Wait for condition(driver) to be truthy and return its value; raise TimeoutException otherwise"""
+        timeout = timeout if timeout is not None else self.timeouts.get(name, 10)
+        start = time.time()
+        try:
+            result = WebDriverWait(self.driver, timeout, poll_frequency=self.poll_frequency).until(condition)
+        except TimeoutException:
+            self.stats.record(name, time.time() - start, True)
+            raise
+        self.stats.record(name, time.time() - start, False)
+        return result
+
+    def try_until(self, name, condition, timeout=None):
+        """Like until() but return None on timeout; used where a fixed sleep used to be"""
+        try:
+            return self.until(name, condition, timeout)
+        except TimeoutException:
+            print(f"Wait '{name}' timed out after {timeout if timeout is not None else self.timeouts.get(name, 10)}s")
+            return None
+
+    # Các điều kiện dùng chung
+
+    @staticmethod
+    def network_idle(driver):
+        try:
+            return driver.execute_script(NETWORK_IDLE_SCRIPT)
+        except WebDriverException:
+            return False
+
+    @staticmethod
+    def first_service_link(driver):
+        """href of the first listing link, used to notice that the list was replaced"""
+        links = driver.find_elements(By.CSS_SELECTOR, xpaths.SERVICE_LINK_CSS)
+        try:
+            return links[0].get_attribute("href") if links else None
+        except WebDriverException:
+            return None
+
+    @staticmethod
+    def listing_ready(driver):
+        return (WaitEngine.network_idle(driver)
+                and driver.find_elements(By.CSS_SELECTOR, "#pageSize")
+                and driver.find_elements(By.CSS_SELECTOR, xpaths.SERVICE_LINK_CSS))
+
+    @staticmethod
+    def page_size_applied(page_size):
+        def condition(driver):
+            try:
+                value = driver.find_element(By.CSS_SELECTOR, "#pageSize").get_attribute("value")
+            except WebDriverException:
+                return False
+            return (value == str(page_size)
+                    and WaitEngine.network_idle(driver)
+                    and len(driver.find_elements(By.CSS_SELECTOR, xpaths.SERVICE_LINK_CSS)) > 0)
+        return condition
+
+    @staticmethod
+    def page_changed(page_number, previous_first_link):
+        """The pagination active marker shows page_number and the list has been replaced"""
+        def condition(driver):
+            try:
+                active = driver.find_element(By.CSS_SELECTOR, ".pagination .active").text.strip()
+            except WebDriverException:
+                return False
+            if active != str(page_number) or not WaitEngine.network_idle(driver):
+                return False
+            first_link = WaitEngine.first_service_link(driver)
+            return first_link is not None and first_link != previous_first_link
+        return condition
+
+    @staticmethod
+    def popup_visible(driver):
+        return EC.visibility_of_element_located((By.ID, xpaths.POPUP_ID))(driver)
+
+    @staticmethod
+    def popup_hidden(driver):
+        return EC.invisibility_of_element_located((By.ID, xpaths.POPUP_ID))(driver)
+
+    @staticmethod
+    def popup_loaded(driver):
+        """Popup is visible and its AJAX content has arrived"""
+        popup = WaitEngine.popup_visible(driver)
+        if popup and WaitEngine.network_idle(driver) and popup.find_elements(By.XPATH, ".//div[contains(@class, 'info-row')]"):
+            return popup
+        return False
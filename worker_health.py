@@ -0,0 +1,132 @@
+"""Health supervision for browser workers.
+
+Each ``ServiceWorker`` keeps a ``WorkerHealth`` record: services served by
+its current driver, consecutive failures and the resident memory of the
+chromedriver + Chrome process tree. When the pool gets a worker back it asks
+the ``HealthPolicy`` whether the driver should be recycled (memory or
+service-count threshold crossed, too many failures in a row, or a crash)
+and, if so, restarts it before handing it out again.
+
+Memory is read with ``psutil`` when it is installed, otherwise from
+``/proc`` (Linux only); elsewhere the memory threshold is not enforced.
+"""
+import os
+import threading
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from retry import DRIVER_CRASH
+
+
+def _proc_children():
+    """Map of parent pid -> child pids read from /proc"""
+    children = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                # The command name may contain spaces, so split after its closing parenthesis
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        children.setdefault(int(fields[1]), []).append(int(name))
+    return children
+
+
+def _proc_rss(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def process_tree_rss(pid):
+    """Resident memory in bytes of a process and all its descendants, or None if unknown"""
+    if pid is None:
+        return None
+    if psutil is not None:
+        try:
+            root = psutil.Process(pid)
+            processes = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return None
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                continue
+        return total
+    if not os.path.isdir("/proc"):
+        return None
+
+    children = _proc_children()
+    total = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        total += _proc_rss(current)
+        stack.extend(children.get(current, []))
+    return total
+
+
+class WorkerHealth:
+    """Counters describing the current driver of one worker"""
+    def __init__(self):
+        self.served = 0
+        self.consecutive_failures = 0
+        self.crashed = False
+        self.rss = None
+        self.recycles = 0
+
+    def record(self, failure):
+        self.served += 1
+        if failure is None:
+            self.consecutive_failures = 0
+        else:
+            self.consecutive_failures += 1
+            self.crashed = self.crashed or failure.kind == DRIVER_CRASH
+
+    def reset(self):
+        self.served = 0
+        self.consecutive_failures = 0
+        self.crashed = False
+        self.rss = None
+
+
+class HealthPolicy:
+    """Thresholds after which a driver is restarted"""
+    def __init__(self, max_rss_mb=1500, max_consecutive_failures=3, max_services=500, check_every=5):
+        self.max_rss = max_rss_mb * 1024 * 1024 if max_rss_mb else None
+        self.max_consecutive_failures = max_consecutive_failures
+        self.max_services = max_services
+        # Reading the process tree costs a /proc scan, so memory is only sampled every few services
+        self.check_every = max(1, check_every)
+        self.lock = threading.Lock()
+        self.recycle_reasons = {}
+
+    def recycle_reason(self, health, pid):
+        """(kind, description) of why the driver should be recycled, or None while it is healthy"""
+        if health.crashed:
+            return "crash", "driver crashed"
+        if self.max_consecutive_failures and health.consecutive_failures >= self.max_consecutive_failures:
+            return "failures", f"{health.consecutive_failures} consecutive failures"
+        if self.max_services and health.served >= self.max_services:
+            return "services", f"served {health.served} services"
+        if self.max_rss and health.served % self.check_every == 0:
+            health.rss = process_tree_rss(pid)
+            if health.rss is not None and health.rss > self.max_rss:
+                return "memory", f"browser memory {health.rss / 1024 / 1024:.0f} MB"
+        return None
+
+    def count(self, kind):
+        with self.lock:
+            self.recycle_reasons[kind] = self.recycle_reasons.get(kind, 0) + 1
@@ -0,0 +1,78 @@
+"""Selectors for the dichvucong.gov.vn pages, shared by every extraction engine.
+
+Keeping them in one place guarantees that the Selenium worker and the
+HTTP-only engine build exactly the same ``title/url/meta/details`` record.
+"""
+
+# Trang danh sách
+SERVICE_LINK_CSS = "ul.list-document li a"
+SERVICE_LINK_XPATH = "//ul[contains(concat(' ', normalize-space(@class), ' '), ' list-document ')]//li//a"
+
+# Trang chi tiết
+TITLE_CSS = "h1.main-title.-none"
+TITLE_XPATH = (
+    "//h1[contains(concat(' ', normalize-space(@class), ' '), ' main-title ')"
+    " and contains(concat(' ', normalize-space(@class), ' '), ' -none ')]"
+)
+POPUP_LINK_CSS = "a.url[data-toggle='modal']"
+POPUP_LINK_XPATH = (
+    "//a[contains(concat(' ', normalize-space(@class), ' '), ' url ')"
+    " and @data-toggle='modal']"
+)
+
+# Popup "Xem chi tiết"
+POPUP_ID = "popupChitietTTHC"
+POPUP_XPATH = "//*[@id='popupChitietTTHC']"
+POPUP_CLOSE_XPATH = ".//div[@class='close']//span[@class='-ap icon icon-close']"
+POPUP_VALUE_XPATH = ".//div[2]"
+
+# (field, row xpath) in output order; the first rows are matched by position
+POPUP_FIELDS = [
+    ("Mã thủ tục", ".//div[contains(@class, 'info-row')][1]"),
+    ("Số quyết định", ".//div[contains(@class, 'info-row')][2]"),
+    ("Cấp thực hiện", ".//div[contains(@class, 'info-row')][4]"),
+    ("Loại thủ tục", ".//div[contains(@class, 'info-row')][5]"),
+    ("Lĩnh vực", ".//div[contains(@class, 'info-row')][6]"),
+    ("Đối tượng thực hiện", ".//div[contains(@class, 'info-row')][contains(.//div[1], 'Đối tượng thực hiện')]"),
+    ("Cơ quan thực hiện", ".//div[contains(@class, 'info-row')][contains(.//div[1], 'Cơ quan thực hiện')]"),
+    ("Cơ quan có thẩm quyền", ".//div[contains(@class, 'info-row')][contains(.//div[1], 'Cơ quan có thẩm quyền')]"),
+    ("Kết quả thực hiện", ".//div[contains(@class, 'info-row')][contains(.//div[1], 'Kết quả thực hiện')]"),
+]
+
+LEGAL_BASIS_FIELD = "Căn cứ pháp lý"
+# Browsers always insert <tbody>; raw HTML parsed outside a browser may not have one
+LEGAL_BASIS_ROW_XPATHS = [
+    ".//div[contains(@class, 'info-row')][contains(.//div[1], 'Căn cứ pháp lý')]//table//tbody//tr",
+    ".//div[contains(@class, 'info-row')][contains(.//div[1], 'Căn cứ pháp lý')]//table//tr",
+]
+LEGAL_BASIS_COLUMNS = ["Số ký hiệu", "Trích yếu", "Ngày ban hành", "Cơ quan ban hành"]
+
+
+def legal_basis_entry(cells):
+    """Build one legal-basis entry from the text of a table row's cells"""
+    return {column: cells[i] if i < len(cells) else "" for i, column in enumerate(LEGAL_BASIS_COLUMNS)}
+
+
+# Các mục chi tiết: (field, [xpath, fallback xpath, ...]) theo thứ tự xuất ra
+DETAIL_SECTIONS = [
+    ("Trình tự thực hiện", ["//h2[contains(text(), 'Trình tự thực hiện')]/following-sibling::div"]),
+    ("Cách thức thực hiện", ["//h2[contains(text(), 'Cách thức thực hiện')]/following-sibling::table"]),
+    ("Thành phần hồ sơ", ["//h2[contains(text(), 'Thành phần hồ sơ')]/following-sibling::div[@class='list-expand']"]),
+]
+
+# Items of the "Thành phần hồ sơ" list-expand block, looked up by their title
+HO_SO_ITEMS_XPATH = "//h2[contains(text(), 'Thành phần hồ sơ')]/following-sibling::div[@class='list-expand']/div[@class='item']"
+HO_SO_ITEM_TITLE_XPATH = ".//div[@class='title']"
+HO_SO_ITEM_CONTENT_XPATH = ".//div[@class='content']"
+HO_SO_ITEM_TITLES = ["Giấy tờ phải nộp", "Giấy tờ phải xuất trình", "Lưu ý"]
+
+DETAIL_ARTICLE_SECTIONS = [
+    ("Cơ quan thực hiện", [
+        "//div[contains(@class, 'item')]/div[contains(@class, 'title') and contains(text(), 'Cơ quan thực hiện')]/following-sibling::div[@class='content']/div[@class='article']",
+        "//h2[contains(text(), 'Cơ quan thực hiện')]/following-sibling::div[@class='article']",
+    ]),
+    ("Yêu cầu, điều kiện thực hiện", [
+        "//div[contains(@class, 'item')]/div[contains(@class, 'title') and contains(text(), 'Yêu cầu, điều kiện')]/following-sibling::div[@class='content']/div[@class='article cls-requires']",
+        "//h2[contains(text(), 'Yêu cầu, điều kiện thực hiện')]/following-sibling::div[@class='article']",
+    ]),
+]